@@ -2,7 +2,10 @@
 
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
+
+from app.db_models import JobStatus
+from app.models import CDetailed, CPrimary
 
 
 class JobResponse(BaseModel):
@@ -16,6 +19,13 @@ class JobResponse(BaseModel):
     completed_at: datetime | None
     error_message: str | None
     transaction_count: int | None
+    batch_id: str | None = None
+    bytes_processed: int | None = None
+    bytes_saved: int | None = None
+    extraction_ms: int | None = None
+    input_tokens: int | None = None
+    output_tokens: int | None = None
+    model: str | None = None
 
     class Config:
         from_attributes = True
@@ -39,6 +49,65 @@ class TransactionResponse(BaseModel):
         from_attributes = True
 
 
+class SuspectedDuplicate(BaseModel):
+    """A transaction that looks like a copy of one from another statement"""
+
+    transaction: TransactionResponse
+    duplicate_of: TransactionResponse
+
+
+class RecategorizeRequest(BaseModel):
+    """Recategorize every transaction of a merchant (exactly one matcher is required)"""
+
+    merchant_key: str | None = Field(
+        None, description="Merchant key, or a title to derive it from"
+    )
+    title_pattern: str | None = Field(
+        None, min_length=2, description="Case-insensitive substring of the title"
+    )
+    category_primary: CPrimary
+    category_detailed: CDetailed
+
+    @model_validator(mode="after")
+    def check_one_matcher(self):
+        if (self.merchant_key is None) == (self.title_pattern is None):
+            raise ValueError("Provide exactly one of merchant_key or title_pattern")
+        return self
+
+
+class RecategorizeResponse(BaseModel):
+    """Result of a bulk recategorization"""
+
+    updated: int
+    previous_categories: dict[str, int]  # Updated rows by their old detailed category
+
+
+class BulkDeleteRequest(BaseModel):
+    """Jobs to delete: every given filter must match (at least one is required)"""
+
+    job_ids: list[str] | None = None
+    batch_id: str | None = None
+    status: JobStatus | None = None
+    created_before: datetime | None = None
+
+    @model_validator(mode="after")
+    def check_any_filter(self):
+        if not any(
+            value is not None
+            for value in (self.job_ids, self.batch_id, self.status, self.created_before)
+        ):
+            raise ValueError("Provide job_ids or at least one filter")
+        return self
+
+
+class BulkDeleteResponse(BaseModel):
+    """Jobs marked for deletion"""
+
+    job_ids: list[str]
+    status: str
+    message: str
+
+
 class UploadResponse(BaseModel):
     """Upload response model"""
 
@@ -47,6 +116,60 @@ class UploadResponse(BaseModel):
     message: str
 
 
+class BatchUploadResponse(BaseModel):
+    """Batch upload response model"""
+
+    batch_id: str
+    job_ids: list[str]
+    status: str
+    message: str
+
+
+class BatchProgressResponse(BaseModel):
+    """Aggregate progress of the jobs in a batch upload"""
+
+    batch_id: str
+    total: int
+    pending: int
+    processing: int
+    completed: int
+    failed: int
+    transaction_count: int
+    done: bool
+
+
+class JobStatsBucket(BaseModel):
+    """Throughput, latency and token spend of the jobs finished in a time bucket"""
+
+    bucket_start: datetime
+    completed: int
+    failed: int
+    jobs_per_hour: float
+    transaction_count: int
+    bytes_processed: int
+    bytes_saved: int
+    input_tokens: int
+    output_tokens: int
+    # Seconds, over completed jobs: upload to completion, upload to the start of
+    # the completing attempt, and the model calls of that attempt
+    latency_p50: float | None
+    latency_p95: float | None
+    latency_p99: float | None
+    queue_wait_p50: float | None
+    queue_wait_p95: float | None
+    extraction_p50: float | None
+    extraction_p95: float | None
+
+
+class JobStatsResponse(BaseModel):
+    """Job stats per time bucket"""
+
+    bucket: str
+    start: datetime
+    end: datetime
+    buckets: list[JobStatsBucket]
+
+
 class CategorySpending(BaseModel):
     """Spending data by category for a specific month"""
 
@@ -91,3 +214,30 @@ class CategoryTrend(BaseModel):
 
     category: str
     data: list[dict]  # List of {month: str, amount: float}
+
+
+class SpendingRollupNode(BaseModel):
+    """Spending total for a month, primary category or detailed category, with its breakdown"""
+
+    name: str
+    total_amount: float
+    transaction_count: int
+    children: list["SpendingRollupNode"] = []
+
+
+class RecurringPayment(BaseModel):
+    """A merchant paid at a regular interval"""
+
+    merchant: str
+    title: str
+    category: str
+    currency: str
+    period: str  # weekly, biweekly, monthly, quarterly or yearly
+    interval_days: float
+    occurrences: int
+    average_amount: float
+    amount_variation: float  # Coefficient of variation of the amounts
+    is_subscription: bool  # Same amount every time
+    first_date: datetime
+    last_date: datetime
+    next_expected_date: datetime
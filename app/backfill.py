@@ -0,0 +1,328 @@
+"""Offline bulk import of a directory of PDF statements
+
+Usage:
+    python -m app.backfill DIRECTORY [--workers N] [--checkpoint FILE]
+
+Extracts transactions from every PDF under DIRECTORY across a process pool and
+writes them straight to the database, bypassing the API and the task queue.
+Every imported file is appended to a checkpoint file, so an interrupted run
+resumes where it stopped, and files that failed are retried by the next run.
+
+Each PDF becomes a COMPLETED job in the bulk lane with an ID derived from its
+content, so re-importing a file replaces its transactions instead of
+duplicating them. All jobs of a run share a batch ID, so progress is also
+visible at GET /batches/{batch_id}.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+
+from app.cache import bump_data_version
+from app.classifier import CategoryClassifier
+from app.database import AsyncSessionLocal
+from app.db_models import Job, JobStatus, TransactionDB
+from app.lanes import BULK
+from app.logger import logger
+from app.models import TransactionList
+from app.partitions import ensure_partitions
+from app.pdf_optimizer import optimize_pdf
+from app.settings import get_settings
+from app.task_worker import insert_transactions, transaction_rows
+from app.worker import ExtractionUsage, GeminiWorker
+
+CHECKPOINT_FILENAME = ".backfill-checkpoint.jsonl"
+
+# Namespace for job IDs derived from PDF content
+JOB_ID_NAMESPACE = uuid.UUID("6f1d1c52-8a7e-4c1b-9a43-2f0e5d8b7c10")
+
+# Created once per pool process by init_process
+gemini_worker = None
+
+
+def init_process():
+    """Process pool initializer: build one Gemini client per process"""
+    global gemini_worker
+    gemini_worker = GeminiWorker()
+
+
+def extract_file(path: str) -> tuple[str, TransactionList, dict]:
+    """
+    Extract transactions from a PDF in a pool process
+
+    Returns:
+        (content SHA-256, extracted transactions, Job accounting fields)
+    """
+    pdf_bytes = Path(path).read_bytes()
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    # Already in a pool process, so optimized in place
+    optimized = optimize_pdf(pdf_bytes)
+    usage = ExtractionUsage()
+    started = time.monotonic()
+    transactions = gemini_worker.extract_transactions_from_pdf_sync(
+        optimized.pdf_bytes, usage
+    )
+    accounting = {
+        "bytes_processed": len(pdf_bytes),
+        "bytes_saved": optimized.bytes_saved,
+        "extraction_ms": int((time.monotonic() - started) * 1000),
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "model": usage.model,
+    }
+    return digest, transactions, accounting
+
+
+def find_pdfs(directory: Path) -> list[Path]:
+    """Every PDF under directory, in a stable order"""
+    return sorted(
+        path
+        for path in directory.rglob("*")
+        if path.is_file() and path.suffix.lower() == ".pdf"
+    )
+
+
+def load_checkpoint(checkpoint: Path) -> set[str]:
+    """Paths already imported according to the checkpoint file"""
+    if not checkpoint.exists():
+        return set()
+    done = set()
+    with checkpoint.open() as f:
+        for line in f:
+            try:
+                done.add(json.loads(line).get("path"))
+            except ValueError:
+                # A line cut short by a crash; that file is imported again
+                continue
+    return done
+
+
+async def save_file(
+    path: Path,
+    digest: str,
+    transactions: TransactionList,
+    accounting: dict,
+    batch_id: str,
+    classifier: CategoryClassifier | None,
+) -> tuple[str, int, int] | None:
+    """
+    Store one PDF's transactions as a completed job in a single transaction
+
+    Returns:
+        (job ID, transactions extracted, transactions inserted), or None if the
+        file's job is being deleted
+    """
+    job_id = str(uuid.uuid5(JOB_ID_NAMESPACE, digest))
+
+    if classifier:
+        try:
+            await classifier.categorize(transactions.transactions)
+        except Exception as e:
+            logger.error(
+                f"Category classifier failed for {path}, keeping LLM categories: {e}",
+                exc_info=True,
+            )
+
+    await ensure_partitions(t.date for t in transactions.transactions)
+
+    now = datetime.now(timezone.utc)
+    transaction_count = len(transactions.transactions)
+    async with AsyncSessionLocal() as session:
+        values = {
+            "filename": path.name[:255],
+            "status": JobStatus.COMPLETED,
+            "started_at": now,
+            "completed_at": now,
+            "transaction_count": transaction_count,
+            "error_message": None,
+            "batch_id": batch_id,
+            **accounting,
+        }
+        result = await session.execute(
+            insert(Job)
+            .values(id=job_id, lane=BULK, **values)
+            .on_conflict_do_update(
+                index_elements=[Job.id],
+                set_=values,
+                where=Job.status != JobStatus.DELETING,
+            )
+            .returning(Job.id)
+        )
+        if result.scalar_one_or_none() is None:
+            await session.rollback()
+            return None
+
+        # Replace rows from an earlier import of the same file
+        await session.execute(
+            delete(TransactionDB).where(TransactionDB.job_id == job_id)
+        )
+        inserted = await insert_transactions(
+            session, transaction_rows(job_id, transactions.transactions)
+        )
+        await bump_data_version(session)
+        await session.commit()
+
+    return job_id, transaction_count, inserted
+
+
+class Progress:
+    """Counts imported files and transactions and prints throughput"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.files = 0
+        self.failed = 0
+        self.extracted = 0
+        self.inserted = 0
+        self.started = time.monotonic()
+
+    def report(self, path: Path, status: str):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        finished = self.files + self.failed
+        files_per_minute = finished / elapsed * 60
+        remaining = self.total - finished
+        eta = remaining / files_per_minute if files_per_minute else 0
+        print(
+            f"[{finished}/{self.total}] {path.name}: {status} | "
+            f"{files_per_minute:.1f} files/min, "
+            f"{self.extracted / elapsed:.1f} transactions/s, "
+            f"ETA {eta:.0f} min",
+            flush=True,
+        )
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self.started
+        return (
+            f"Imported {self.files} file(s), {self.inserted} new of "
+            f"{self.extracted} extracted transactions in {elapsed:.0f}s; "
+            f"{self.failed} file(s) failed"
+        )
+
+
+async def backfill(directory: Path, checkpoint: Path, workers: int) -> Progress:
+    """Import every PDF under directory not already in the checkpoint"""
+    done = load_checkpoint(checkpoint)
+    pending = [path for path in find_pdfs(directory.resolve()) if str(path) not in done]
+    progress = Progress(len(pending))
+    print(
+        f"{len(pending)} PDF(s) to import, {len(done)} already done, "
+        f"{workers} worker process(es)",
+        flush=True,
+    )
+    if not pending:
+        return progress
+
+    settings = get_settings()
+    classifier = CategoryClassifier() if settings.CLASSIFIER_ENABLED else None
+    batch_id = str(uuid.uuid4())
+    logger.info(f"Backfilling {directory} as batch {batch_id}")
+
+    loop = asyncio.get_running_loop()
+    # Spawned rather than forked, so pool processes don't inherit the event loop
+    # or database connections
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_process,
+    )
+    paths = iter(pending)
+    in_flight: dict[asyncio.Future, Path] = {}
+
+    def submit_next():
+        path = next(paths, None)
+        if path is not None:
+            future = loop.run_in_executor(pool, extract_file, str(path))
+            in_flight[future] = path
+
+    try:
+        # Keep every process busy with one file queued behind it
+        for _ in range(workers * 2):
+            submit_next()
+
+        with checkpoint.open("a") as checkpoint_file:
+            while in_flight:
+                finished, _ = await asyncio.wait(
+                    in_flight, return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in finished:
+                    path = in_flight.pop(future)
+                    submit_next()
+                    try:
+                        digest, transactions, accounting = future.result()
+                        saved = await save_file(
+                            path, digest, transactions, accounting, batch_id, classifier
+                        )
+                    except Exception as e:
+                        logger.error(f"Failed to import {path}: {e}", exc_info=True)
+                        progress.failed += 1
+                        progress.report(path, f"failed ({e})")
+                        continue
+                    if saved is None:
+                        progress.failed += 1
+                        progress.report(path, "skipped, its job is being deleted")
+                        continue
+
+                    job_id, extracted, inserted = saved
+                    checkpoint_file.write(
+                        json.dumps(
+                            {
+                                "path": str(path),
+                                "job_id": job_id,
+                                "transactions": extracted,
+                            }
+                        )
+                        + "\n"
+                    )
+                    checkpoint_file.flush()
+                    progress.files += 1
+                    progress.extracted += extracted
+                    progress.inserted += inserted
+                    progress.report(path, f"{extracted} transactions, {inserted} new")
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import a directory of PDF statements without the API or queue"
+    )
+    parser.add_argument("directory", type=Path, help="Directory searched for PDFs")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 4,
+        help="Extraction processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        help=f"Progress file (default: DIRECTORY/{CHECKPOINT_FILENAME})",
+    )
+    args = parser.parse_args()
+
+    if not args.directory.is_dir():
+        parser.error(f"{args.directory} is not a directory")
+    checkpoint = args.checkpoint or args.directory / CHECKPOINT_FILENAME
+
+    progress = asyncio.run(backfill(args.directory, checkpoint, max(args.workers, 1)))
+    print(progress.summary())
+    if progress.failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Caching of analyses until the data they were computed from changes"""
+
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db_models import DataVersion
+
+# Data version bumped by every write to the transactions table
+TRANSACTIONS = "transactions"
+
+
+async def bump_data_version(session: AsyncSession, name: str = TRANSACTIONS):
+    """
+    Increment a data version as part of the session's transaction
+
+    Call this in the same transaction as the write, so readers never see new
+    rows with an old version.
+    """
+    await session.execute(
+        insert(DataVersion)
+        .values(name=name, version=1)
+        .on_conflict_do_update(
+            index_elements=[DataVersion.name],
+            set_={"version": DataVersion.version + 1, "updated_at": func.now()},
+        )
+    )
+
+
+async def get_data_version(session: AsyncSession, name: str = TRANSACTIONS) -> int:
+    """Return the current data version (0 if the data was never written)"""
+    result = await session.execute(
+        select(DataVersion.version).where(DataVersion.name == name)
+    )
+    return result.scalar_one_or_none() or 0
+
+
+class VersionedCache:
+    """
+    LRU cache whose entries are only valid for the data version they were computed at
+
+    Checking a version is one primary-key lookup, so every API process can keep
+    its own cache and still never serve results older than the database.
+    """
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self.entries: OrderedDict[Hashable, tuple[int, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, version: int) -> Any | None:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != version:
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Hashable, version: int, value: Any):
+        self.entries[key] = (version, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
@@ -0,0 +1,213 @@
+"""Circuit breaker that stops calling a failing or slow dependency"""
+
+import asyncio
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from app.logger import logger
+from app.metrics import Counter, Gauge
+from app.settings import get_settings
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+StateListener = Callable[[str], Awaitable[None]]
+FailurePredicate = Callable[[Exception], bool]
+
+circuit_state_gauge = Gauge(
+    "parivyaya_circuit_state",
+    "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ("circuit",),
+)
+circuit_calls_counter = Counter(
+    "parivyaya_circuit_calls_total",
+    "Calls through a circuit breaker by outcome",
+    ("circuit", "outcome"),
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the dependency while the circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Tracks the error rate and latency of calls to a dependency
+
+    The circuit opens once at least CIRCUIT_MIN_CALLS calls in the last
+    CIRCUIT_WINDOW_SECONDS have a failure rate of CIRCUIT_FAILURE_RATE, or a
+    rate of calls slower than their slow_call_seconds of CIRCUIT_SLOW_CALL_RATE.
+    Only exceptions for which is_failure returns True are failures; any other
+    exception (or cancellation) says nothing about the dependency and is passed
+    on without being recorded. While open, calls fail fast with
+    CircuitOpenError. After the open period the circuit lets
+    CIRCUIT_HALF_OPEN_CALLS trial calls through: if they all succeed it
+    closes, otherwise it opens again for twice as long (up to
+    CIRCUIT_OPEN_MAX_SECONDS).
+
+    Listeners are awaited with the new state on every transition.
+    """
+
+    def __init__(self, name: str, is_failure: FailurePredicate = lambda error: True):
+        self.settings = get_settings()
+        self.name = name
+        self.is_failure = is_failure
+        self.state = CLOSED
+        # (finished at, failed, slow) per call, oldest first
+        self.calls: deque[tuple[float, bool, bool]] = deque()
+        self.open_seconds = self.settings.CIRCUIT_OPEN_SECONDS
+        self.trials_started = 0
+        self.trials_succeeded = 0
+        self.listeners: list[StateListener] = []
+        self.half_open_timer: asyncio.Task | None = None
+        circuit_state_gauge.set(STATE_VALUES[CLOSED], circuit=name)
+
+    def add_listener(self, listener: StateListener):
+        self.listeners.append(listener)
+
+    async def call(
+        self,
+        function: Callable[..., Awaitable[Any]],
+        *args,
+        slow_call_seconds: float | None = None,
+        **kwargs,
+    ):
+        """
+        Call function through the breaker
+
+        Args:
+            function: Coroutine function calling the dependency
+            slow_call_seconds: Duration from which the call counts as slow, or
+                None to never count it as slow
+
+        Raises:
+            CircuitOpenError: The circuit is open, or half-open with every trial
+                call already taken
+        """
+        if self.state == OPEN or (
+            self.state == HALF_OPEN
+            and self.trials_started >= self.settings.CIRCUIT_HALF_OPEN_CALLS
+        ):
+            circuit_calls_counter.inc(circuit=self.name, outcome="rejected")
+            raise CircuitOpenError(f"Circuit {self.name} is open")
+
+        trial = self.state == HALF_OPEN
+        if trial:
+            self.trials_started += 1
+
+        started = time.monotonic()
+        try:
+            result = await function(*args, **kwargs)
+        except Exception as e:
+            if self.is_failure(e):
+                await self.record(started, True, trial, slow_call_seconds)
+            else:
+                self.release_trial(trial)
+            raise
+        except BaseException:
+            self.release_trial(trial)
+            raise
+        await self.record(started, False, trial, slow_call_seconds)
+        return result
+
+    def release_trial(self, trial: bool):
+        """Give back the trial permit of a call that wasn't recorded"""
+        if trial and self.state == HALF_OPEN and self.trials_started > 0:
+            self.trials_started -= 1
+
+    async def record(
+        self,
+        started: float,
+        failed: bool,
+        trial: bool,
+        slow_call_seconds: float | None,
+    ):
+        """Record a call's outcome and open or close the circuit accordingly"""
+        now = time.monotonic()
+        slow = slow_call_seconds is not None and now - started >= slow_call_seconds
+        outcome = "failure" if failed else "slow" if slow else "success"
+        circuit_calls_counter.inc(circuit=self.name, outcome=outcome)
+
+        if trial and self.state == HALF_OPEN:
+            if failed or slow:
+                self.open_seconds = min(
+                    self.open_seconds * 2, self.settings.CIRCUIT_OPEN_MAX_SECONDS
+                )
+                await self.open(f"trial call {outcome}")
+                return
+            self.trials_succeeded += 1
+            if self.trials_succeeded >= self.settings.CIRCUIT_HALF_OPEN_CALLS:
+                await self.close()
+            return
+        if self.state != CLOSED:
+            # A call started before the circuit opened
+            return
+
+        self.calls.append((now, failed, slow))
+        while (
+            self.calls and self.calls[0][0] < now - self.settings.CIRCUIT_WINDOW_SECONDS
+        ):
+            self.calls.popleft()
+        if len(self.calls) < self.settings.CIRCUIT_MIN_CALLS:
+            return
+
+        failure_rate = sum(call[1] for call in self.calls) / len(self.calls)
+        slow_rate = sum(call[2] for call in self.calls) / len(self.calls)
+        if failure_rate >= self.settings.CIRCUIT_FAILURE_RATE:
+            await self.open(f"{failure_rate:.0%} of recent calls failed")
+        elif slow_rate >= self.settings.CIRCUIT_SLOW_CALL_RATE:
+            await self.open(f"{slow_rate:.0%} of recent calls were slow")
+
+    async def open(self, reason: str):
+        logger.warning(
+            f"Circuit {self.name} opened for {self.open_seconds:.0f}s: {reason}"
+        )
+        self.calls.clear()
+        self.cancel()
+        self.half_open_timer = asyncio.create_task(
+            self.half_open_after(self.open_seconds)
+        )
+        await self.transition(OPEN)
+
+    async def half_open_after(self, delay: float):
+        await asyncio.sleep(delay)
+        self.trials_started = 0
+        self.trials_succeeded = 0
+        logger.info(f"Circuit {self.name} half-open, probing with trial calls")
+        await self.transition(HALF_OPEN)
+
+        # Work handed out for a trial may never reach the dependency (e.g. its
+        # job was already finished), so offer trials again until there's a verdict
+        while self.state == HALF_OPEN:
+            await asyncio.sleep(delay)
+            if (
+                self.state == HALF_OPEN
+                and self.trials_started < self.settings.CIRCUIT_HALF_OPEN_CALLS
+            ):
+                await self.transition(HALF_OPEN)
+
+    async def close(self):
+        logger.info(f"Circuit {self.name} closed, trial calls succeeded")
+        self.open_seconds = self.settings.CIRCUIT_OPEN_SECONDS
+        await self.transition(CLOSED)
+
+    async def transition(self, state: str):
+        self.state = state
+        circuit_state_gauge.set(STATE_VALUES[state], circuit=self.name)
+        for listener in self.listeners:
+            try:
+                await listener(state)
+            except Exception as e:
+                logger.error(
+                    f"Circuit {self.name} listener failed on {state}: {e}",
+                    exc_info=True,
+                )
+
+    def cancel(self):
+        """Stop the pending transition to half-open, if any"""
+        if self.half_open_timer:
+            self.half_open_timer.cancel()
@@ -0,0 +1,185 @@
+"""Nearest-neighbour category classifier trained on saved transactions"""
+
+import asyncio
+import zlib
+
+import numpy as np
+from sqlalchemy import select
+
+from app.cache import get_data_version
+from app.database import AsyncSessionLocal
+from app.db_models import TransactionDB
+from app.logger import logger
+from app.metrics import Counter
+from app.models import CDetailed, Confidence
+from app.normalize import normalize_title
+from app.settings import get_settings
+
+# Character n-grams are hashed into this many dimensions
+VECTOR_SIZE = 2048
+NGRAM_SIZE = 3
+
+predictions_counter = Counter(
+    "parivyaya_classifier_predictions_total",
+    "Extracted transactions checked by the local category classifier",
+    ("result",),
+)
+
+
+def vectorize(titles: list[str]) -> np.ndarray:
+    """
+    Embed normalized titles as L2-normalized hashed character n-gram counts
+
+    Reference numbers are dropped by normalize_title, so "UBER *TRIP 1234" and
+    "UBER *TRIP 9876" get identical vectors.
+    """
+    vectors = np.zeros((len(titles), VECTOR_SIZE), dtype=np.float32)
+    rows, columns = [], []
+    for row, title in enumerate(titles):
+        padded = f" {title} "
+        for start in range(len(padded) - NGRAM_SIZE + 1):
+            ngram = padded[start : start + NGRAM_SIZE].encode("utf-8")
+            rows.append(row)
+            columns.append(zlib.crc32(ngram) % VECTOR_SIZE)
+    np.add.at(vectors, (rows, columns), 1.0)
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+class CategoryClassifier:
+    """
+    Categorizes titles by their most similar previously saved title
+
+    The index holds one vector per distinct normalized title among the newest
+    CLASSIFIER_MAX_ENTRIES categorized transactions, labelled with the
+    categories of its most recent transaction, so corrections win over older
+    rows. refresh() re-reads those transactions whenever the transactions data
+    version changed, which also covers rows committed out of id order and
+    recategorized ones, but only vectorizes titles that weren't indexed yet.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.titles: list[str] = []
+        self.labels: list[tuple[str, str]] = []
+        self.positions: dict[str, int] = {}
+        self.vectors = np.zeros((0, VECTOR_SIZE), dtype=np.float32)
+        self.version: int | None = None
+        self.lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self.titles)
+
+    async def refresh(self):
+        """Rebuild the index if transactions changed since the last refresh"""
+        async with self.lock:
+            async with AsyncSessionLocal() as session:
+                # Read the version before the rows, so rows committed in
+                # between are read again by the next refresh instead of missed
+                version = await get_data_version(session)
+                if version == self.version:
+                    return
+
+                result = await session.execute(
+                    select(
+                        TransactionDB.title,
+                        TransactionDB.category_primary,
+                        TransactionDB.category_detailed,
+                    )
+                    .where(TransactionDB.category_detailed != CDetailed.UNCLASSIFIED)
+                    .order_by(TransactionDB.id.desc())
+                    .limit(self.settings.CLASSIFIER_MAX_ENTRIES)
+                )
+                rows = result.all()
+
+            vectorized = await asyncio.to_thread(self.rebuild, rows)
+            self.version = version
+            logger.info(
+                f"Category classifier indexed {len(rows)} transactions, "
+                f"{len(self)} titles ({vectorized} new)"
+            )
+
+    def rebuild(self, rows) -> int:
+        """
+        Replace the index with (title, category_primary, category_detailed)
+        rows, newest first
+
+        Returns:
+            Number of titles that had to be vectorized
+        """
+        titles, labels, positions = [], [], {}
+        for row in rows:
+            title = normalize_title(row.title)
+            if not title or title in positions:
+                continue
+            positions[title] = len(titles)
+            titles.append(title)
+            labels.append((row.category_primary, row.category_detailed))
+
+        vectors = np.empty((len(titles), VECTOR_SIZE), dtype=np.float32)
+        known = [i for i, title in enumerate(titles) if title in self.positions]
+        vectors[known] = self.vectors[[self.positions[titles[i]] for i in known]]
+        new = [i for i, title in enumerate(titles) if title not in self.positions]
+        if new:
+            vectors[new] = vectorize([titles[i] for i in new])
+
+        self.titles = titles
+        self.labels = labels
+        self.positions = positions
+        self.vectors = vectors
+        return len(new)
+
+    def predict(self, titles: list[str]) -> list[tuple[str, str, float] | None]:
+        """
+        Predict (category_primary, category_detailed, similarity) for each title
+
+        Returns None for titles with no indexed title at least
+        CLASSIFIER_MIN_SIMILARITY similar (cosine).
+        """
+        if not titles or not self.titles:
+            return [None] * len(titles)
+
+        similarities = vectorize([normalize_title(t) for t in titles]) @ self.vectors.T
+        best = similarities.argmax(axis=1)
+        best_similarity = similarities[np.arange(len(titles)), best]
+
+        predictions = []
+        for index, similarity in zip(best, best_similarity):
+            if similarity >= self.settings.CLASSIFIER_MIN_SIMILARITY:
+                predictions.append((*self.labels[index], float(similarity)))
+            else:
+                predictions.append(None)
+        return predictions
+
+    async def categorize(self, transactions: list) -> int:
+        """
+        Apply confident predictions to extracted transactions in place
+
+        Transactions without a confident match keep the LLM's categories.
+
+        Returns:
+            Number of transactions categorized by the classifier
+        """
+        await self.refresh()
+        async with self.lock:
+            predictions = await asyncio.to_thread(
+                self.predict, [t.title for t in transactions]
+            )
+
+        matched = 0
+        for transaction, prediction in zip(transactions, predictions):
+            if prediction is None:
+                continue
+            primary, detailed, similarity = prediction
+            transaction.category_primary = primary
+            transaction.category_detailed = detailed
+            transaction.category_confidence_level = (
+                Confidence.VERY_HIGH if similarity >= 0.99 else Confidence.HIGH
+            )
+            matched += 1
+
+        predictions_counter.inc(matched, result="matched")
+        predictions_counter.inc(len(transactions) - matched, result="unmatched")
+        return matched
@@ -1,21 +1,41 @@
 """Database connection and session management"""
 
+import asyncio
+import time
 from collections.abc import AsyncGenerator
+from pathlib import Path
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import make_url, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 
+from app.db_instrumentation import (
+    instrument_engine,
+    pool_checkout_histogram,
+    statement_timeout_settings,
+)
+from app.logger import logger
 from app.settings import get_settings
 
 settings = get_settings()
 
-# Create async engine
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+
+# Create async engine for writes (ingestion, job bookkeeping)
 engine = create_async_engine(
     settings.DATABASE_URL,
     echo=False,  # Set to True for SQL query logging
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    connect_args=statement_timeout_settings(settings.DB_STATEMENT_TIMEOUT_MS),
 )
+instrument_engine(engine, "write")
 
 # Create async session factory
 AsyncSessionLocal = async_sessionmaker(
@@ -27,10 +47,141 @@ AsyncSessionLocal = async_sessionmaker(
 )
 
 
+def create_read_engine(url: str, pool_name: str) -> AsyncEngine:
+    """Create an engine with its own pool whose sessions are read-only"""
+    connect_args = statement_timeout_settings(settings.DB_READ_STATEMENT_TIMEOUT_MS)
+    connect_args["server_settings"]["default_transaction_read_only"] = "on"
+    read_engine = create_async_engine(
+        url,
+        echo=False,
+        pool_pre_ping=True,
+        pool_size=settings.DB_READ_POOL_SIZE,
+        max_overflow=settings.DB_READ_MAX_OVERFLOW,
+        connect_args=connect_args,
+    )
+    instrument_engine(read_engine, pool_name)
+    return read_engine
+
+
+def read_sessionmaker(read_engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(
+        read_engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autocommit=False,
+        autoflush=False,
+    )
+
+
+# Seconds the replica is behind the primary; 0 when it has replayed all it received
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "END"
+)
+
+
+class Replica:
+    """A read replica and its most recently measured replication lag"""
+
+    def __init__(self, url: str):
+        self.name = f"read-{make_url(url).host}"
+        self.engine = create_read_engine(url, self.name)
+        self.sessionmaker = read_sessionmaker(self.engine)
+        self.lag: float | None = None
+        self.checked_at = 0.0
+
+    async def check_lag(self):
+        try:
+            async with self.engine.connect() as conn:
+                self.lag = float((await conn.execute(REPLICA_LAG_QUERY)).scalar_one())
+        except (DBAPIError, OSError) as e:
+            logger.warning(f"Read replica {self.engine.url.host} unavailable: {e}")
+            self.lag = None
+        self.checked_at = time.monotonic()
+
+    @property
+    def healthy(self) -> bool:
+        return self.lag is not None and self.lag <= settings.REPLICA_MAX_LAG_SECONDS
+
+
+class ReadRouter:
+    """
+    Routes read-only sessions across replicas, falling back to the primary
+
+    Replica lag is re-measured at most every REPLICA_LAG_CHECK_SECONDS, on the
+    request path, so routing costs nothing between checks. Replicas that are
+    unreachable or lag more than REPLICA_MAX_LAG_SECONDS are skipped; when none
+    qualify, reads go to the primary through its own read pool, separate from
+    the write pool.
+    """
+
+    def __init__(self, replica_urls: list[str], primary_url: str):
+        self.replicas = [Replica(url) for url in replica_urls]
+        self.primary_engine = create_read_engine(primary_url, "read-primary")
+        self.primary_sessionmaker = read_sessionmaker(self.primary_engine)
+        self.next_index = 0
+        self.lock = asyncio.Lock()
+
+    async def refresh_lag(self):
+        if not self.replicas:
+            return
+        now = time.monotonic()
+        stale = [
+            replica
+            for replica in self.replicas
+            if now - replica.checked_at >= settings.REPLICA_LAG_CHECK_SECONDS
+        ]
+        if not stale:
+            return
+        async with self.lock:
+            # Another request may have refreshed while we waited for the lock
+            now = time.monotonic()
+            stale = [
+                replica
+                for replica in stale
+                if now - replica.checked_at >= settings.REPLICA_LAG_CHECK_SECONDS
+            ]
+            await asyncio.gather(*(replica.check_lag() for replica in stale))
+
+    async def choose(self) -> tuple[str, async_sessionmaker[AsyncSession]]:
+        """
+        Pick a healthy replica round-robin, or the primary if there is none
+
+        Returns:
+            The pool name and its session factory
+        """
+        await self.refresh_lag()
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return "read-primary", self.primary_sessionmaker
+        self.next_index = (self.next_index + 1) % len(healthy)
+        replica = healthy[self.next_index]
+        return replica.name, replica.sessionmaker
+
+    @property
+    def engines(self) -> list[AsyncEngine]:
+        return [self.primary_engine] + [replica.engine for replica in self.replicas]
+
+
+read_router = ReadRouter(
+    [url.strip() for url in settings.DATABASE_READ_URLS.split(",") if url.strip()],
+    settings.DATABASE_URL,
+)
+
+
+async def checkout(session: AsyncSession, pool_name: str):
+    """Acquire the session's connection up front, recording the pool wait"""
+    started = time.perf_counter()
+    await session.connection()
+    pool_checkout_histogram.observe(time.perf_counter() - started, pool=pool_name)
+
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """Dependency for getting async database session"""
     async with AsyncSessionLocal() as session:
         try:
+            await checkout(session, "write")
             yield session
             await session.commit()
         except Exception:
@@ -40,9 +191,62 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """Dependency for a read-only session on a replica (or the primary's read pool)"""
+    pool_name, sessionmaker = await read_router.choose()
+    async with sessionmaker() as session:
+        try:
+            await checkout(session, pool_name)
+            yield session
+        finally:
+            await session.rollback()
+            await session.close()
+
+
 async def init_db():
     """Initialize database tables"""
     from app.db_models import Base
 
     async with engine.begin() as conn:
+        # Trigram indexes on transaction titles need pg_trgm
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(Base.metadata.create_all)
+
+
+async def get_schema_version() -> str | None:
+    """Return the Alembic revision the database is at, or None if unversioned"""
+    async with engine.connect() as conn:
+        try:
+            result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+        except DBAPIError:
+            return None
+        return result.scalar_one_or_none()
+
+
+def get_head_version() -> str:
+    """Return the latest Alembic revision shipped with the app"""
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory(str(MIGRATIONS_DIR)).get_current_head()
+
+
+async def check_schema():
+    """
+    Verify the database schema on startup, according to DB_SCHEMA_CHECK
+
+    "version" compares the migration version with a single query and refuses to
+    start on a stale schema, "create" runs create_all for throwaway databases,
+    and "off" skips the check.
+    """
+    if settings.DB_SCHEMA_CHECK == "off":
+        return
+    if settings.DB_SCHEMA_CHECK == "create":
+        await init_db()
+        return
+
+    current, head = await get_schema_version(), get_head_version()
+    if current != head:
+        raise RuntimeError(
+            f"Database schema is at revision {current}, expected {head}. "
+            "Run `alembic upgrade head`."
+        )
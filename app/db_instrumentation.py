@@ -0,0 +1,97 @@
+"""Connection pool metrics and slow query logging for database engines"""
+
+import hashlib
+import re
+import time
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.logger import logger
+from app.metrics import Counter, Gauge, Histogram
+from app.settings import get_settings
+
+settings = get_settings()
+
+pool_size_gauge = Gauge(
+    "parivyaya_db_pool_size", "Configured connections per pool", ("pool",)
+)
+pool_in_use_gauge = Gauge(
+    "parivyaya_db_pool_in_use", "Connections checked out of the pool", ("pool",)
+)
+pool_overflow_gauge = Gauge(
+    "parivyaya_db_pool_overflow", "Connections open beyond the pool size", ("pool",)
+)
+pool_checkout_histogram = Histogram(
+    "parivyaya_db_pool_checkout_seconds",
+    "Time a request waited for a pooled connection",
+    ("pool",),
+)
+query_histogram = Histogram(
+    "parivyaya_db_query_seconds", "Statement execution time", ("pool",)
+)
+slow_query_counter = Counter(
+    "parivyaya_db_slow_queries_total",
+    "Statements slower than DB_SLOW_QUERY_MS",
+    ("pool",),
+)
+
+# Placeholders (with any asyncpg type cast) and literals become "?", then
+# lists of them and repeated VALUES rows collapse, so statements that differ
+# only in parameter count fingerprint the same
+PLACEHOLDERS = re.compile(r"(?:\$\d+|%\(\w+\)s)(?:::[\w.]+(?:\[\])?)?")
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+REPEATED_LISTS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """Reduce a statement to its shape, without parameters or literals"""
+    statement = PLACEHOLDERS.sub("?", statement)
+    statement = LITERALS.sub("?", statement)
+    statement = LISTS.sub("(...)", statement)
+    statement = REPEATED_LISTS.sub("(...)", statement)
+    return WHITESPACE.sub(" ", statement).strip()
+
+
+def sql_fingerprint(statement: str) -> str:
+    """Short stable ID for all executions of the same statement shape"""
+    return hashlib.sha1(normalize_sql(statement).encode("utf-8")).hexdigest()[:12]
+
+
+def instrument_engine(engine: AsyncEngine, pool_name: str):
+    """Track pool usage and statement timings of an engine under pool_name"""
+    sync_engine = engine.sync_engine
+    pool = sync_engine.pool
+    pool_size_gauge.set(pool.size(), pool=pool_name)
+
+    def update_pool_gauges(*_):
+        pool_in_use_gauge.set(pool.checkedout(), pool=pool_name)
+        pool_overflow_gauge.set(max(pool.overflow(), 0), pool=pool_name)
+
+    event.listen(pool, "checkout", update_pool_gauges)
+    event.listen(pool, "checkin", update_pool_gauges)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info["query_start"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        started = conn.info.pop("query_start", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        query_histogram.observe(elapsed, pool=pool_name)
+        if elapsed * 1000 >= settings.DB_SLOW_QUERY_MS:
+            slow_query_counter.inc(pool=pool_name)
+            logger.warning(
+                f"Slow query {sql_fingerprint(statement)} on {pool_name} pool "
+                f"took {elapsed * 1000:.0f}ms: {normalize_sql(statement)[:500]}"
+            )
+
+
+def statement_timeout_settings(timeout_ms: int) -> dict:
+    """asyncpg connect_args applying a server-side statement timeout (0 disables)"""
+    return {"server_settings": {"statement_timeout": str(timeout_ms)}}
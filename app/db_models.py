@@ -3,7 +3,21 @@
 from datetime import datetime
 from enum import Enum as PyEnum
 
-from sqlalchemy import DateTime, Enum, Float, String, Text, func
+from sqlalchemy import (
+    BigInteger,
+    Computed,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    Index,
+    LargeBinary,
+    String,
+    Text,
+    func,
+    text,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -20,6 +34,7 @@ class JobStatus(str, PyEnum):
     PROCESSING = "PROCESSING"
     COMPLETED = "COMPLETED"
     FAILED = "FAILED"
+    DELETING = "DELETING"  # Transactions are being purged in the background
 
 
 class Job(Base):
@@ -43,11 +58,79 @@ class Job(Base):
     )
     error_message: Mapped[str | None] = mapped_column(Text, nullable=True)
     transaction_count: Mapped[int | None] = mapped_column(nullable=True)
+    batch_id: Mapped[str | None] = mapped_column(
+        String(36), nullable=True, index=True
+    )  # Set for jobs created by a batch upload
+    client_id: Mapped[str | None] = mapped_column(
+        String(100), nullable=True
+    )  # Uploader, for per-client admission quotas
+
+    # Cost and latency accounting, recorded by the worker. Tokens add up over
+    # every attempt; the rest describe the attempt that completed the job.
+    bytes_processed: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    # Removed by PDF optimization before extraction
+    bytes_saved: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    extraction_ms: Mapped[int | None] = mapped_column(nullable=True)
+    input_tokens: Mapped[int | None] = mapped_column(nullable=True)
+    output_tokens: Mapped[int | None] = mapped_column(nullable=True)
+    model: Mapped[str | None] = mapped_column(String(50), nullable=True)
+
+    # Queue bookkeeping (used for claiming by the Postgres queue backend)
+    lane: Mapped[str] = mapped_column(
+        String(20), nullable=False, default="interactive", server_default="interactive"
+    )
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0, server_default="0")
+    available_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    # Lease held by the worker processing the job, extended by heartbeats
+    worker_id: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    lease_expires_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+    __table_args__ = (
+        # Time-bucketed job stats
+        Index("ix_jobs_completed_at", "completed_at"),
+        Index(
+            "ix_jobs_client_in_flight",
+            "client_id",
+            postgresql_where=text("status IN ('PENDING', 'PROCESSING')"),
+        ),
+        Index(
+            "ix_jobs_lease_expires_at",
+            "lease_expires_at",
+            postgresql_where=text("status = 'PROCESSING'"),
+        ),
+        Index(
+            "ix_jobs_claimable",
+            "lane",
+            "available_at",
+            postgresql_where=text("status IN ('PENDING', 'PROCESSING')"),
+        ),
+    )
 
     def __repr__(self):
         return f"<Job(id={self.id}, filename={self.filename}, status={self.status})>"
 
 
+class JobPayload(Base):
+    """PDF content for a queued job, kept out of the jobs table to keep it narrow"""
+
+    __tablename__ = "job_payloads"
+
+    job_id: Mapped[str] = mapped_column(
+        String(36), ForeignKey("jobs.id", ondelete="CASCADE"), primary_key=True
+    )
+    pdf_content: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f"<JobPayload(job_id={self.job_id}, size={len(self.pdf_content)})>"
+
+
 class TransactionDB(Base):
     """Transaction storage table"""
 
@@ -55,9 +138,13 @@ class TransactionDB(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     job_id: Mapped[str] = mapped_column(
-        String(36), nullable=False, index=True
-    )  # FK to Job
-    date: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+        String(36),
+        ForeignKey("jobs.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    # Partition key, so part of the primary key
+    date: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
     title: Mapped[str] = mapped_column(String(500), nullable=False)
     amount: Mapped[float] = mapped_column(Float, nullable=False)
     currency: Mapped[str] = mapped_column(String(10), nullable=False)
@@ -67,6 +154,55 @@ class TransactionDB(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
+    # Duplicate detection, see app.normalize. Rows inserted before fingerprints
+    # existed that duplicate an earlier row keep a NULL fingerprint (NULLs never
+    # conflict in the unique index).
+    fingerprint: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    merchant_key: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    # Maintained by Postgres for full-text search; deferred so it's never loaded
+    title_search: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed("to_tsvector('simple', title)", persisted=True),
+        deferred=True,
+    )
+
+    __table_args__ = (
+        # Unique indexes on a partitioned table must include the partition key;
+        # the fingerprint covers the date already, so this is still per fingerprint
+        Index("ux_transactions_fingerprint", "fingerprint", "date", unique=True),
+        Index("ix_transactions_merchant_amount", "merchant_key", "amount"),
+        # Date-range and per-category filters on the spending endpoints
+        Index("ix_transactions_date", "date"),
+        Index("ix_transactions_category_primary_date", "category_primary", "date"),
+        Index("ix_transactions_category_detailed_date", "category_detailed", "date"),
+        Index("ix_transactions_title_search", "title_search", postgresql_using="gin"),
+        Index(
+            "ix_transactions_title_trgm",
+            "title",
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"},
+        ),
+        # Monthly partitions are created on demand by app.partitions
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
 
     def __repr__(self):
         return f"<Transaction(id={self.id}, job_id={self.job_id}, title={self.title}, amount={self.amount})>"
+
+
+class DataVersion(Base):
+    """Counter bumped whenever a table's rows change, for invalidating cached analyses"""
+
+    __tablename__ = "data_versions"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+    def __repr__(self):
+        return f"<DataVersion(name={self.name}, version={self.version})>"
@@ -0,0 +1,71 @@
+"""Command line tool for inspecting and replaying dead-lettered tasks
+
+Usage:
+    python -m app.dlq list
+    python -m app.dlq replay [--task-id ID ...] [--limit N]
+
+Works against the configured QUEUE_BACKEND. Replay re-queues dead-lettered
+tasks on their lane with a fresh attempt counter. Only tasks whose job is still
+FAILED are replayed, so running it twice never queues the same job twice.
+"""
+
+import argparse
+import asyncio
+
+from app.queues import create_task_queue
+
+
+async def list_dead_letters():
+    """Print a summary of every dead-lettered task"""
+    task_queue = create_task_queue()
+    await task_queue.start()
+    try:
+        dead_letters = await task_queue.list_dead_letters()
+    finally:
+        await task_queue.stop()
+
+    for dead_letter in dead_letters:
+        print(
+            f"{dead_letter.task_id}\t{dead_letter.filename}\t"
+            f"attempts={dead_letter.attempts}\terror={dead_letter.error}"
+        )
+    print(f"{len(dead_letters)} dead-lettered task(s)")
+
+
+async def replay_dead_letters(task_ids: set[str] | None, limit: int | None):
+    """Re-queue FAILED dead-lettered tasks"""
+    task_queue = create_task_queue()
+    await task_queue.start()
+    try:
+        replayed = await task_queue.replay_dead_letters(task_ids, limit)
+    finally:
+        await task_queue.stop()
+
+    print(f"Replayed {replayed} task(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Inspect or replay dead-lettered tasks"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("list", help="List dead-lettered tasks")
+
+    replay_parser = subparsers.add_parser("replay", help="Replay dead-lettered tasks")
+    replay_parser.add_argument(
+        "--task-id", action="append", dest="task_ids", help="Only replay this task"
+    )
+    replay_parser.add_argument("--limit", type=int, help="Maximum tasks to replay")
+
+    args = parser.parse_args()
+
+    if args.command == "list":
+        asyncio.run(list_dead_letters())
+    else:
+        task_ids = set(args.task_ids) if args.task_ids else None
+        asyncio.run(replay_dead_letters(task_ids, args.limit))
+
+
+if __name__ == "__main__":
+    main()
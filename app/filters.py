@@ -0,0 +1,79 @@
+"""Shared query filters for transaction and spending endpoints"""
+
+from datetime import date, timedelta
+
+from fastapi import Query
+from sqlalchemy import Select, exists
+
+from app.db_models import Job, JobStatus, TransactionDB
+
+
+def exclude_deleting(query: Select, transactions=TransactionDB) -> Select:
+    """
+    Leave out transactions of jobs marked DELETING
+
+    Their rows are purged in the background, so they must look deleted from the
+    moment the job is marked. transactions may be an alias of TransactionDB.
+    """
+    return query.where(
+        ~exists().where(Job.id == transactions.job_id, Job.status == JobStatus.DELETING)
+    )
+
+
+class TransactionFilters:
+    """
+    Date, statement, category and amount filters, as a FastAPI dependency
+
+    Filters are applied as WHERE clauses so aggregates only read the matching
+    rows; date ranges are served by the (date) and (category, date) indexes.
+    """
+
+    def __init__(
+        self,
+        start_date: date | None = Query(None, description="Earliest transaction date"),
+        end_date: date | None = Query(
+            None, description="Latest transaction date (inclusive)"
+        ),
+        job_ids: list[str] | None = Query(
+            None, description="Only transactions from these jobs (statements)"
+        ),
+        categories: list[str] | None = Query(
+            None, description="Only these categories of the selected category type"
+        ),
+        min_amount: float | None = Query(None, description="Minimum amount"),
+        max_amount: float | None = Query(None, description="Maximum amount"),
+    ):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.job_ids = job_ids
+        self.categories = categories
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+
+    def apply(self, query: Select, category_field=TransactionDB.category_detailed):
+        """Add the filters to a query over TransactionDB"""
+        query = exclude_deleting(query)
+        if self.start_date:
+            query = query.where(TransactionDB.date >= self.start_date)
+        if self.end_date:
+            query = query.where(TransactionDB.date < self.end_date + timedelta(days=1))
+        if self.job_ids:
+            query = query.where(TransactionDB.job_id.in_(self.job_ids))
+        if self.categories:
+            query = query.where(category_field.in_(self.categories))
+        if self.min_amount is not None:
+            query = query.where(TransactionDB.amount >= self.min_amount)
+        if self.max_amount is not None:
+            query = query.where(TransactionDB.amount <= self.max_amount)
+        return query
+
+    def cache_key(self) -> tuple:
+        """A hashable key identifying these filter values"""
+        return (
+            self.start_date,
+            self.end_date,
+            tuple(sorted(self.job_ids or ())),
+            tuple(sorted(self.categories or ())),
+            self.min_amount,
+            self.max_amount,
+        )
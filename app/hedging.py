@@ -0,0 +1,127 @@
+"""Deadline-bounded calls with an optional hedged second request"""
+
+import asyncio
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from app.metrics import Counter, Histogram
+
+T = TypeVar("T")
+
+LATENCY_BUCKETS = (1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300)
+
+llm_latency_histogram = Histogram(
+    "parivyaya_llm_request_seconds",
+    "Latency of individual LLM requests that returned a result",
+    ("request",),
+    buckets=LATENCY_BUCKETS,
+)
+llm_calls_counter = Counter(
+    "parivyaya_llm_calls_total",
+    "Deadline-bounded LLM calls by outcome and whether a hedge was sent",
+    ("outcome", "hedged"),
+)
+hedges_counter = Counter(
+    "parivyaya_llm_hedges_total",
+    "Hedged requests by result (won: answered first, lost: the primary did)",
+    ("result",),
+)
+
+
+class DeadlineExceededError(Exception):
+    """No request returned a result within the call's deadline"""
+
+
+class LatencyTracker:
+    """Recent request latencies, for picking the hedge delay"""
+
+    def __init__(self, size: int = 200):
+        self.latencies: deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float):
+        self.latencies.append(seconds)
+
+    def percentile(self, quantile: float) -> float | None:
+        """The latency at quantile (0-1), or None without enough samples"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(quantile * len(ordered)), len(ordered) - 1)]
+
+
+async def hedged_call(
+    request: Callable[[], Awaitable[T]],
+    deadline: float,
+    hedge_after: float | None,
+    tracker: LatencyTracker | None = None,
+) -> T:
+    """
+    Run request, sending a second identical request if the first is slow
+
+    Whichever request returns a result first wins and the other is cancelled.
+    A request that fails while the other is still running doesn't fail the call.
+
+    Args:
+        request: Starts one request each time it is called
+        deadline: Seconds after which every request is cancelled
+        hedge_after: Seconds to wait for the first request before hedging, or
+            None to never hedge
+        tracker: Records the latency of requests that return a result
+
+    Raises:
+        DeadlineExceededError: Nothing returned within deadline
+    """
+
+    async def timed(name: str) -> T:
+        started = time.monotonic()
+        result = await request()
+        elapsed = time.monotonic() - started
+        llm_latency_histogram.observe(elapsed, request=name)
+        if tracker:
+            tracker.observe(elapsed)
+        return result
+
+    primary = asyncio.create_task(timed("primary"))
+    requests = {primary}
+    hedge = None
+
+    def hedged() -> str:
+        return "true" if hedge is not None else "false"
+
+    try:
+        async with asyncio.timeout(deadline):
+            if hedge_after is not None and hedge_after < deadline:
+                done, _ = await asyncio.wait(requests, timeout=hedge_after)
+                if not done:
+                    hedge = asyncio.create_task(timed("hedge"))
+                    requests.add(hedge)
+
+            pending = set(requests)
+            while True:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                winner = next((task for task in done if not task.exception()), None)
+                if winner is not None:
+                    break
+                if not pending:
+                    # Every request failed; report the primary's error
+                    raise (primary.exception() or hedge.exception())
+    except TimeoutError:
+        llm_calls_counter.inc(outcome="deadline_exceeded", hedged=hedged())
+        raise DeadlineExceededError(
+            f"No LLM response within the {deadline:.0f}s deadline"
+        ) from None
+    except Exception:
+        llm_calls_counter.inc(outcome="error", hedged=hedged())
+        raise
+    finally:
+        for task in requests:
+            task.cancel()
+
+    llm_calls_counter.inc(outcome="success", hedged=hedged())
+    if hedge is not None:
+        hedges_counter.inc(result="won" if winner is hedge else "lost")
+    return winner.result()
@@ -0,0 +1,43 @@
+"""Size-aware priority lanes for extraction tasks"""
+
+from app.settings import get_settings
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES = (INTERACTIVE, BULK)
+
+
+def choose_lane(size_bytes: int, page_count: int | None) -> str:
+    """
+    Route small documents to the interactive lane and large ones to the bulk lane
+
+    Args:
+        size_bytes: PDF size in bytes
+        page_count: Number of pages, or None if unknown
+
+    Returns:
+        Lane name
+    """
+    settings = get_settings()
+    if size_bytes > settings.INTERACTIVE_MAX_BYTES:
+        return BULK
+    if page_count is not None and page_count > settings.INTERACTIVE_MAX_PAGES:
+        return BULK
+    return INTERACTIVE
+
+
+def lane_topic(lane: str) -> str:
+    """Kafka topic that carries tasks for a lane"""
+    settings = get_settings()
+    return settings.KAFKA_BULK_TOPIC if lane == BULK else settings.KAFKA_TOPIC
+
+
+def lane_concurrency(lane: str) -> int:
+    """Share of WORKER_CONCURRENCY reserved for a lane, weighted by LANE_WEIGHT_*"""
+    settings = get_settings()
+    weights = {
+        INTERACTIVE: settings.LANE_WEIGHT_INTERACTIVE,
+        BULK: settings.LANE_WEIGHT_BULK,
+    }
+    share = settings.WORKER_CONCURRENCY * weights[lane] / sum(weights.values())
+    return max(1, round(share))
@@ -1,71 +1,84 @@
 #!/usr/bin/env python
 
 import asyncio
-import json
 from contextlib import asynccontextmanager
 
-from aiokafka import AIOKafkaProducer
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database import init_db
-from app.kafka_worker import KafkaGeminiWorker
+from app.admission import AdmissionController
+from app.database import check_schema
 from app.logger import logger
-from app.routes import jobs, spending, transactions
+from app.purge import JobPurger
+from app.queues import create_task_queue
+from app.routes import jobs, metrics, spending, transactions
 from app.settings import get_settings
 
 settings = get_settings()
 
-# Global Kafka producer and worker
-kafka_producer = None
-kafka_worker = None
+# Global task queue, admission controller, purger and worker
+task_queue = None
+admission = None
+purger = None
+task_worker = None
 worker_task = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown"""
-    global kafka_producer, kafka_worker, worker_task
-
-    # Initialize database
-    logger.info("Initializing database...")
-    await init_db()
-    logger.info("Database initialized")
-
-    # Startup: Initialize Kafka producer
-    logger.info("Starting Kafka producer...")
-    kafka_producer = AIOKafkaProducer(
-        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
-        value_serializer=lambda v: json.dumps(v).encode("utf-8"),
-    )
-    await kafka_producer.start()
-    logger.info("Kafka producer started")
-
-    # Store kafka_producer in app state so routes can access it
-    app.state.kafka_producer = kafka_producer
-
-    # Startup: Initialize and start Kafka worker in background
-    logger.info("Starting Kafka consumer worker...")
-    kafka_worker = KafkaGeminiWorker()
-    worker_task = asyncio.create_task(kafka_worker.start())
-    logger.info("Kafka consumer worker started in background")
+    global task_queue, admission, purger, task_worker, worker_task
+
+    # Check database schema
+    logger.info("Checking database schema...")
+    await check_schema()
+    logger.info("Database schema is up to date")
+
+    # Startup: Initialize the task queue
+    logger.info(f"Starting {settings.QUEUE_BACKEND} task queue...")
+    task_queue = create_task_queue()
+    await task_queue.start()
+    logger.info("Task queue started")
+
+    # Startup: Track queue depth for upload admission control
+    admission = AdmissionController(task_queue)
+    await admission.start()
+
+    # Startup: Purge jobs marked for deletion in the background
+    purger = JobPurger()
+    await purger.start()
+
+    # Store task_queue, admission and purger in app state so routes can access them
+    app.state.task_queue = task_queue
+    app.state.admission = admission
+    app.state.purger = purger
+
+    # Startup: Initialize and start the task worker in background. The worker
+    # (and the LLM client it loads) is only imported when this process runs it.
+    if settings.RUN_WORKER:
+        from app.task_worker import GeminiTaskWorker
+
+        logger.info("Starting task worker...")
+        task_worker = GeminiTaskWorker(task_queue)
+        worker_task = asyncio.create_task(task_worker.start())
+        logger.info("Task worker started in background")
 
     yield
 
-    # Shutdown: Stop Kafka worker
-    logger.info("Stopping Kafka consumer worker...")
-    await kafka_worker.stop()
-    worker_task.cancel()
-    try:
-        await worker_task
-    except asyncio.CancelledError:
-        pass
-    logger.info("Kafka consumer worker stopped")
+    # Shutdown: Stop consuming new tasks
+    if worker_task:
+        logger.info("Stopping task worker...")
+        worker_task.cancel()
+        try:
+            await worker_task
+        except asyncio.CancelledError:
+            pass
 
-    # Shutdown: Close Kafka producer
-    logger.info("Stopping Kafka producer...")
-    await kafka_producer.stop()
-    logger.info("Kafka producer stopped")
+    # Shutdown: Wait for in-flight tasks and close the task queue
+    await purger.stop()
+    await admission.stop()
+    await task_queue.stop()
+    logger.info("Task worker and task queue stopped")
 
 
 app = FastAPI(title="Parivyaya AI API", version="0.1.0", lifespan=lifespan)
@@ -90,3 +103,4 @@ async def root():
 app.include_router(jobs.router)
 app.include_router(transactions.router)
 app.include_router(spending.router)
+app.include_router(metrics.router)
@@ -0,0 +1,109 @@
+"""Routing of documents to extraction model tiers by complexity"""
+
+from dataclasses import dataclass
+
+from app.metrics import Counter, Histogram
+from app.models import CDetailed, Confidence, TransactionList
+from app.pdf import count_pages, has_text_layer
+from app.settings import get_settings
+
+SIMPLE = "simple"
+STANDARD = "standard"
+COMPLEX = "complex"
+# Tier index each complexity starts at, clamped to the configured tiers
+START_TIERS = {SIMPLE: 0, STANDARD: 1, COMPLEX: 2}
+
+tier_latency_histogram = Histogram(
+    "parivyaya_extraction_tier_seconds",
+    "Time spent extracting a document with a model tier",
+    ("model",),
+    buckets=(1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300),
+)
+tier_results_counter = Counter(
+    "parivyaya_extraction_tier_results_total",
+    "Extractions per model tier by result (accepted, escalated, invalid, error)",
+    ("model", "result"),
+)
+routed_documents_counter = Counter(
+    "parivyaya_extraction_routed_total",
+    "Documents routed by complexity",
+    ("complexity",),
+)
+
+
+@dataclass
+class DocumentProfile:
+    """What the router knows about a document before extracting it"""
+
+    size_bytes: int
+    page_count: int | None
+    text_layer: bool | None
+
+    @property
+    def complexity(self) -> str:
+        settings = get_settings()
+        if self.text_layer is False:
+            # Scanned statements need the strongest model to read them
+            return COMPLEX
+        if self.page_count is not None:
+            if self.page_count >= settings.ROUTER_COMPLEX_MIN_PAGES:
+                return COMPLEX
+            if (
+                self.page_count <= settings.ROUTER_SIMPLE_MAX_PAGES
+                and self.size_bytes <= settings.ROUTER_SIMPLE_MAX_BYTES
+            ):
+                return SIMPLE
+        return STANDARD
+
+
+def profile_document(pdf_bytes: bytes) -> DocumentProfile:
+    return DocumentProfile(
+        size_bytes=len(pdf_bytes),
+        page_count=count_pages(pdf_bytes),
+        text_layer=has_text_layer(pdf_bytes),
+    )
+
+
+def model_tiers() -> list[str]:
+    """Configured extraction models, cheapest first"""
+    tiers = [m.strip() for m in get_settings().EXTRACTION_MODEL_TIERS.split(",")]
+    tiers = [m for m in tiers if m]
+    if not tiers:
+        raise ValueError("EXTRACTION_MODEL_TIERS must list at least one model")
+    return tiers
+
+
+def route(pdf_bytes: bytes) -> list[str]:
+    """
+    Models to try for a document, in order
+
+    The first is the cheapest tier suited to the document's complexity; the
+    rest are the stronger tiers to escalate to.
+    """
+    tiers = model_tiers()
+    complexity = profile_document(pdf_bytes).complexity
+    routed_documents_counter.inc(complexity=complexity)
+    return tiers[min(START_TIERS[complexity], len(tiers) - 1) :]
+
+
+def escalation_reason(transactions: TransactionList) -> str | None:
+    """
+    Why an extraction result should be redone by a stronger tier, if at all
+
+    Returns:
+        A reason when nothing was extracted or too many transactions have low
+        confidence or no category, else None
+    """
+    settings = get_settings()
+    if not transactions.transactions:
+        return "no transactions extracted"
+
+    uncertain = sum(
+        t.category_confidence_level == Confidence.LOW
+        or t.category_detailed == CDetailed.UNCLASSIFIED
+        for t in transactions.transactions
+    )
+    rate = uncertain / len(transactions.transactions)
+    if rate >= settings.ROUTER_ESCALATE_LOW_CONFIDENCE_RATE:
+        return f"{rate:.0%} of transactions have low confidence"
+    return None
@@ -0,0 +1,93 @@
+"""Normalization of transaction titles and duplicate fingerprints"""
+
+import hashlib
+import re
+from collections import Counter
+from collections.abc import Iterable
+from datetime import date, datetime
+
+# Words banks add around the merchant name that differ between statement formats
+NOISE_WORDS = frozenset(
+    {
+        "pos",
+        "purchase",
+        "debit",
+        "credit",
+        "card",
+        "visa",
+        "mastercard",
+        "interac",
+        "payment",
+        "preauthorized",
+        "pre",
+        "auth",
+        "online",
+        "contactless",
+        "tap",
+        "ref",
+    }
+)
+
+MERCHANT_KEY_WORDS = 2
+
+
+def normalize_title(title: str) -> str:
+    """
+    Reduce a transaction title to the words that identify the merchant
+
+    Lowercases, drops punctuation, reference numbers (any word containing a
+    digit) and card-network noise words, so the same purchase exported by two
+    banks normalizes to the same string.
+    """
+    words = re.findall(r"[a-z0-9]+", title.lower())
+    return " ".join(
+        word
+        for word in words
+        if word not in NOISE_WORDS and not any(c.isdigit() for c in word)
+    )
+
+
+def merchant_key(title: str) -> str:
+    """The leading words of the normalized title, used to match near duplicates"""
+    return " ".join(normalize_title(title).split()[:MERCHANT_KEY_WORDS])
+
+
+def fingerprint(
+    txn_date: date | datetime,
+    amount: float,
+    currency: str,
+    title: str,
+    occurrence: int = 1,
+) -> str:
+    """
+    Fingerprint of a transaction for exact duplicate detection
+
+    occurrence numbers identical transactions within one statement (two
+    coffees of the same price on the same day), so they aren't collapsed into
+    one while the same pair on an overlapping statement still is.
+    """
+    if isinstance(txn_date, datetime):
+        txn_date = txn_date.date()
+    key = "|".join(
+        (
+            txn_date.isoformat(),
+            f"{amount:.2f}",
+            currency.upper(),
+            normalize_title(title),
+            str(occurrence),
+        )
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def fingerprints(
+    transactions: Iterable[tuple[date | datetime, float, str, str]],
+) -> list[str]:
+    """Fingerprint the (date, amount, currency, title) rows of one statement in order"""
+    occurrences = Counter()
+    result = []
+    for txn_date, amount, currency, title in transactions:
+        base = fingerprint(txn_date, amount, currency, title, occurrence=0)
+        occurrences[base] += 1
+        result.append(fingerprint(txn_date, amount, currency, title, occurrences[base]))
+    return result
@@ -0,0 +1,197 @@
+"""Monthly range partitions of the transactions table
+
+Usage:
+    python -m app.partitions list
+    python -m app.partitions detach --before YYYY-MM [--drop]
+
+Partitions are created on demand before transactions are inserted. Rows of a
+month without a partition, e.g. one detached while another process still had
+it cached, land in the default partition instead of failing the insert.
+Detaching a month turns it into a standalone table (transactions_yYYYYmMM) that
+can be dumped and dropped without touching the rest of the history.
+
+Postgres refuses DETACH PARTITION ... CONCURRENTLY while a default partition
+exists, so months are detached with a plain DETACH. It is a catalog-only change
+but needs an ACCESS EXCLUSIVE lock on the whole table, which blocks reads and
+writes for as long as it waits; DETACH_LOCK_TIMEOUT bounds that wait, and a
+detach that times out can simply be run again.
+"""
+
+import argparse
+import asyncio
+from collections.abc import Iterable
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.cache import bump_data_version
+from app.database import AsyncSessionLocal, engine
+from app.logger import logger
+
+PARENT_TABLE = "transactions"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+
+# How long a detach may wait for its lock on the table (queued behind running
+# queries, and blocking every new one meanwhile)
+DETACH_LOCK_TIMEOUT = "5s"
+
+# Months known to have a partition, so DDL is only attempted once per process
+known_partitions: set[date] = set()
+
+
+def month_start(value: date | datetime) -> date:
+    """First day of value's month; timezone-aware datetimes are taken in UTC"""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return date(value.year, value.month, 1)
+
+
+def month_bound(month: date) -> str:
+    """Midnight UTC at the start of month, as a timestamptz literal"""
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc).isoformat()
+
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year}m{month.month:02d}"
+
+
+def create_partition_sql(month: date) -> str:
+    """DDL creating the partition holding one month of transactions (UTC bounds)"""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} "
+        f"PARTITION OF {PARENT_TABLE} FOR VALUES "
+        f"FROM ('{month_bound(month)}') TO ('{month_bound(next_month(month))}')"
+    )
+
+
+def create_default_partition_sql() -> str:
+    """DDL creating the partition for rows no monthly partition accepts"""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} "
+        f"PARTITION OF {PARENT_TABLE} DEFAULT"
+    )
+
+
+async def ensure_partitions(dates: Iterable[date | datetime]):
+    """
+    Create the monthly partitions needed to insert transactions with these dates
+
+    Runs on its own connection, outside the caller's transaction. If creation
+    fails (e.g. a concurrent worker won the race, or the default partition
+    already holds rows of that month) it is retried next time, and the rows go
+    to the default partition meanwhile.
+    """
+    months = {month_start(d) for d in dates} - known_partitions
+    for month in sorted(months):
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text(create_partition_sql(month)))
+        except DBAPIError as e:
+            # Most likely another process created it concurrently; if not, the
+            # rows go to the default partition and the next call tries again
+            logger.warning(f"Could not create partition {partition_name(month)}: {e}")
+            continue
+        known_partitions.add(month)
+
+
+async def list_partitions() -> list[tuple[str, str, int]]:
+    """(name, bounds, estimated rows) of every attached partition, default included"""
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text(
+                "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), "
+                "c.reltuples::bigint "
+                "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = CAST(:parent AS regclass) ORDER BY c.relname"
+            ),
+            {"parent": PARENT_TABLE},
+        )
+        return [tuple(row) for row in result.all()]
+
+
+async def detach_partitions(before: date, drop: bool) -> list[str]:
+    """
+    Detach (and optionally drop) every monthly partition older than before
+
+    Each month is detached in its own short transaction that locks the table,
+    see the module docstring.
+    """
+    detached = []
+    for name, _, _ in await list_partitions():
+        if name == DEFAULT_PARTITION:
+            continue
+        try:
+            year, month = int(name[-7:-3]), int(name[-2:])
+        except ValueError:
+            continue
+        if date(year, month, 1) >= before:
+            continue
+
+        async with engine.begin() as conn:
+            await conn.execute(
+                text(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'")
+            )
+            await conn.execute(
+                text(f"LOCK TABLE {PARENT_TABLE} IN ACCESS EXCLUSIVE MODE")
+            )
+            await conn.execute(
+                text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+            )
+            if drop:
+                await conn.execute(text(f"DROP TABLE {name}"))
+        known_partitions.discard(date(year, month, 1))
+        detached.append(name)
+
+    if detached:
+        # Cached analyses included the detached months
+        async with AsyncSessionLocal() as session:
+            await bump_data_version(session)
+            await session.commit()
+    return detached
+
+
+async def run_list():
+    for name, bounds, rows in await list_partitions():
+        print(f"{name}\t{bounds}\t~{max(rows, 0)} rows")
+
+
+async def run_detach(before: date, drop: bool):
+    detached = await detach_partitions(before, drop)
+    action = "Detached and dropped" if drop else "Detached"
+    print(f"{action} {len(detached)} partition(s): {', '.join(detached) or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage transaction partitions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("list", help="List monthly partitions")
+
+    detach_parser = subparsers.add_parser(
+        "detach", help="Detach months older than --before"
+    )
+    detach_parser.add_argument(
+        "--before",
+        required=True,
+        type=lambda value: datetime.strptime(value, "%Y-%m").date(),
+        help="First month to keep (YYYY-MM)",
+    )
+    detach_parser.add_argument(
+        "--drop", action="store_true", help="Drop the detached tables"
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "list":
+        asyncio.run(run_list())
+    else:
+        asyncio.run(run_detach(args.before, args.drop))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Lightweight PDF inspection helpers that don't require a PDF library"""
+
+import re
+
+# Matches page objects ("/Type /Page") but not the page tree ("/Type /Pages")
+PAGE_OBJECT_PATTERN = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+
+def count_pages(pdf_bytes: bytes) -> int | None:
+    """
+    Estimate the number of pages in a PDF by counting page objects
+
+    Args:
+        pdf_bytes: PDF file content as bytes
+
+    Returns:
+        Page count, or None if pages are hidden inside compressed object streams
+    """
+    count = len(PAGE_OBJECT_PATTERN.findall(pdf_bytes))
+    return count or None
+
+
+# Font resources are only needed to draw text, so their presence means the PDF
+# has a text layer; scanned statements usually only contain images
+FONT_PATTERN = re.compile(rb"/Font\b")
+IMAGE_PATTERN = re.compile(rb"/Subtype\s*/Image\b")
+
+
+def has_text_layer(pdf_bytes: bytes) -> bool | None:
+    """
+    Guess whether a PDF has extractable text or is scanned images only
+
+    Args:
+        pdf_bytes: PDF file content as bytes
+
+    Returns:
+        True if fonts are referenced, False if only images are found, or None if
+        the resources are hidden inside compressed object streams
+    """
+    if FONT_PATTERN.search(pdf_bytes):
+        return True
+    if IMAGE_PATTERN.search(pdf_bytes):
+        return False
+    return None
@@ -0,0 +1,184 @@
+"""Shrinking PDFs before they are sent to the model
+
+Statements often carry pages without transactions (marketing inserts, legal
+terms), high-resolution logos and scans, and metadata. All of it is uploaded
+and paid for as input tokens, so optimize_pdf rewrites the document without
+them. It needs the optional "pdf" extra (pypdf and Pillow) and returns the
+document unchanged without it, or whenever the rewrite wouldn't be smaller.
+
+optimize_pdf is CPU-bound; async callers run it in a thread.
+"""
+
+import io
+import re
+from dataclasses import dataclass
+
+from app.logger import logger
+from app.metrics import Counter
+from app.settings import get_settings
+
+pdf_optimize_counter = Counter(
+    "parivyaya_pdf_optimize_total",
+    "PDFs by optimization result (optimized, unchanged, skipped, error)",
+    ("result",),
+)
+pdf_bytes_saved_counter = Counter(
+    "parivyaya_pdf_bytes_saved_total",
+    "Bytes removed from PDFs before extraction",
+)
+pdf_pages_dropped_counter = Counter(
+    "parivyaya_pdf_pages_dropped_total",
+    "Pages without transactions dropped from PDFs before extraction",
+)
+
+# A page lists transactions if its text has both an amount and a date
+AMOUNT_PATTERN = re.compile(r"(?<![\d.])\d{1,3}(?:[,.\s]?\d{3})*[.,]\d{2}(?![\d.])")
+MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+DATE_PATTERN = re.compile(
+    rf"\b\d{{4}}-\d{{2}}-\d{{2}}\b"
+    rf"|\b\d{{1,2}}/\d{{1,2}}(?:/\d{{2,4}})?\b"
+    rf"|\b\d{{1,2}}[.-]\d{{1,2}}[.-]\d{{2,4}}\b"
+    rf"|\b{MONTHS}\s*\d{{1,2}}\b"
+    rf"|\b\d{{1,2}}\s*{MONTHS}",
+    re.IGNORECASE,
+)
+
+# Page entries the model never looks at
+UNUSED_PAGE_KEYS = ("/Thumb", "/Metadata", "/PieceInfo")
+
+missing_library_logged = False
+
+
+@dataclass
+class OptimizedPdf:
+    """A PDF as it will be sent to the model"""
+
+    pdf_bytes: bytes
+    original_size: int
+    pages_dropped: int = 0
+    images_downsampled: int = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_size - len(self.pdf_bytes)
+
+
+def lists_transactions(text: str) -> bool:
+    """Whether a page's text looks like it lists transactions"""
+    return bool(AMOUNT_PATTERN.search(text) and DATE_PATTERN.search(text))
+
+
+def optimize_pdf(pdf_bytes: bytes) -> OptimizedPdf:
+    """
+    Drop pages without transactions, downsample large images and strip
+    metadata
+
+    Pages without a text layer (scans) are always kept, and so is every page
+    when none of them looks like it lists transactions. Fonts are kept since
+    the model reads the text they draw, but identical fonts and images embedded
+    on several pages are stored once.
+
+    Args:
+        pdf_bytes: PDF file content as bytes
+
+    Returns:
+        The optimized PDF, or the original one if it couldn't be made smaller
+    """
+    global missing_library_logged
+    unchanged = OptimizedPdf(pdf_bytes, len(pdf_bytes))
+    if not get_settings().PDF_OPTIMIZE_ENABLED:
+        return unchanged
+
+    try:
+        import pypdf
+    except ImportError:
+        if not missing_library_logged:
+            logger.warning(
+                "pypdf is not installed, PDFs are sent to the model unoptimized"
+            )
+            missing_library_logged = True
+        pdf_optimize_counter.inc(result="skipped")
+        return unchanged
+
+    try:
+        optimized = rewrite(pypdf, pdf_bytes)
+    except Exception as e:
+        logger.warning(f"Could not optimize PDF, sending it unchanged: {e}")
+        pdf_optimize_counter.inc(result="error")
+        return unchanged
+
+    if optimized is None or optimized.bytes_saved <= 0:
+        pdf_optimize_counter.inc(result="unchanged")
+        return unchanged
+
+    pdf_optimize_counter.inc(result="optimized")
+    pdf_bytes_saved_counter.inc(optimized.bytes_saved)
+    pdf_pages_dropped_counter.inc(optimized.pages_dropped)
+    return optimized
+
+
+def rewrite(pypdf, pdf_bytes: bytes) -> OptimizedPdf | None:
+    """Write an optimized copy of the PDF, or None if it is encrypted"""
+    settings = get_settings()
+    reader = pypdf.PdfReader(io.BytesIO(pdf_bytes))
+    if reader.is_encrypted:
+        return None
+
+    pages = list(reader.pages)
+    if settings.PDF_OPTIMIZE_DROP_PAGES:
+        texts = [(page.extract_text() or "").strip() for page in pages]
+        if any(lists_transactions(text) for text in texts):
+            pages = [
+                page
+                for page, text in zip(pages, texts)
+                if not text or lists_transactions(text)
+            ]
+
+    # Only the pages are copied: document metadata, outlines, attachments and
+    # scripts are left behind
+    writer = pypdf.PdfWriter()
+    for page in pages:
+        writer.add_page(page)
+
+    downsampled = 0
+    for page in writer.pages:
+        for key in UNUSED_PAGE_KEYS:
+            page.pop(key, None)
+        downsampled += downsample_images(page, settings)
+        page.compress_content_streams()
+    writer.compress_identical_objects()
+
+    output = io.BytesIO()
+    writer.write(output)
+    return OptimizedPdf(
+        output.getvalue(),
+        len(pdf_bytes),
+        pages_dropped=len(reader.pages) - len(pages),
+        images_downsampled=downsampled,
+    )
+
+
+def downsample_images(page, settings) -> int:
+    """
+    Shrink a page's images to PDF_OPTIMIZE_MAX_IMAGE_SIDE pixels on their long
+    side
+
+    Returns:
+        Number of images replaced
+    """
+    max_side = settings.PDF_OPTIMIZE_MAX_IMAGE_SIDE
+    replaced = 0
+    for image_file in page.images:
+        try:
+            image = image_file.image
+            if image is None or max(image.size) <= max_side:
+                continue
+            image.thumbnail((max_side, max_side))
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            image_file.replace(image, quality=settings.PDF_OPTIMIZE_IMAGE_QUALITY)
+            replaced += 1
+        except Exception as e:
+            # Inline images, unusual color spaces or no Pillow: keep the original
+            logger.debug(f"Could not downsample image {image_file.name}: {e}")
+    return replaced
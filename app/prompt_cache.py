@@ -0,0 +1,365 @@
+"""Provider-side context caching of the static extraction prompt
+
+Usage:
+    python -m app.prompt_cache check
+
+The system prompt, including the output schema, is identical for every
+extraction, so it is uploaded once per model as a Gemini cached content
+resource and requests only reference it by name. Cached input tokens are billed
+at a fraction of the normal rate and don't have to be processed again for each
+request.
+
+Caches expire after PROMPT_CACHE_TTL_SECONDS. Shortly before that the TTL is
+extended. A cache that can't be created is retried after
+PROMPT_CACHE_RETRY_SECONDS, and requests send the full prompt meanwhile; a model
+that rejects the prompt outright (e.g. it is below the model's minimum cacheable
+size) isn't retried until restart.
+
+The check command runs the cache against the local stand-in backend with a
+simulated clock and verifies hits, refreshes and retries.
+"""
+
+import argparse
+import hashlib
+import math
+import sys
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Protocol
+
+from app.logger import logger
+from app.metrics import Counter
+from app.settings import get_settings
+
+prompt_cache_counter = Counter(
+    "parivyaya_prompt_cache_total",
+    "Prompt cache lookups by result (hit, created, refreshed, unavailable, error, "
+    "rejected)",
+    ("model", "result"),
+)
+input_tokens_counter = Counter(
+    "parivyaya_llm_input_tokens_total",
+    "Input tokens of LLM responses, read from the prompt cache or sent in full",
+    ("model", "source"),
+)
+
+
+class CacheRejectedError(Exception):
+    """The provider will never cache this prompt for the model"""
+
+
+class CacheBackend(Protocol):
+    """Creates and extends cached content holding a system prompt"""
+
+    def create(self, model: str, system_prompt: str, ttl_seconds: int) -> str:
+        """Cache system_prompt for model, returning the cache's name"""
+
+    def refresh(self, name: str, ttl_seconds: int):
+        """Extend the TTL of an existing cache"""
+
+
+class GeminiCacheBackend:
+    """
+    Explicit context caching through the Gemini API
+
+    Uses the generative language client that langchain-google-genai is built
+    on, so it needs no extra dependency.
+    """
+
+    def __init__(self):
+        from google.ai import generativelanguage_v1beta as genai
+
+        self.genai = genai
+        self.client = genai.CacheServiceClient(
+            client_options={"api_key": get_settings().GOOGLE_API_KEY}
+        )
+
+    def create(self, model: str, system_prompt: str, ttl_seconds: int) -> str:
+        from google.api_core.exceptions import InvalidArgument
+
+        try:
+            cache = self.client.create_cached_content(
+                cached_content=self.genai.CachedContent(
+                    model=model if model.startswith("models/") else f"models/{model}",
+                    display_name=f"parivyaya-extraction-{model}",
+                    system_instruction=self.genai.Content(
+                        parts=[self.genai.Part(text=system_prompt)]
+                    ),
+                    ttl=timedelta(seconds=ttl_seconds),
+                )
+            )
+        except InvalidArgument as e:
+            # Too few tokens for the model, or caching unsupported by it
+            raise CacheRejectedError(str(e)) from e
+        return cache.name
+
+    def refresh(self, name: str, ttl_seconds: int):
+        from google.protobuf.field_mask_pb2 import FieldMask
+
+        self.client.update_cached_content(
+            cached_content=self.genai.CachedContent(
+                name=name, ttl=timedelta(seconds=ttl_seconds)
+            ),
+            update_mask=FieldMask(paths=["ttl"]),
+        )
+
+
+class LocalCacheBackend:
+    """
+    In-process stand-in for the provider's cache, for local runs and tests
+
+    Names are never sent to the model (see PromptCache.remote), but creations and
+    refreshes are recorded so cache-hit behaviour can be checked without a
+    Gemini account.
+    """
+
+    def __init__(self):
+        self.prompts: dict[str, str] = {}
+        self.created = 0
+        self.refreshed = 0
+
+    def create(self, model: str, system_prompt: str, ttl_seconds: int) -> str:
+        digest = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:12]
+        name = f"local/{model}/{digest}"
+        self.prompts[name] = system_prompt
+        self.created += 1
+        return name
+
+    def refresh(self, name: str, ttl_seconds: int):
+        if name not in self.prompts:
+            raise KeyError(f"Unknown cache {name}")
+        self.refreshed += 1
+
+
+@dataclass
+class CacheEntry:
+    name: str | None
+    expires_at: float  # PromptCache.clock(); for failed creations, when to retry
+
+
+def create_cache_backend(backend: str | None = None) -> CacheBackend | None:
+    """
+    Create the cache backend configured by PROMPT_CACHE_BACKEND
+
+    Args:
+        backend: Override for PROMPT_CACHE_BACKEND ("gemini", "local" or "off")
+
+    Returns:
+        Backend instance, or None when caching is off
+    """
+    backend = backend or get_settings().PROMPT_CACHE_BACKEND
+    if backend == "gemini":
+        try:
+            return GeminiCacheBackend()
+        except ImportError as e:
+            logger.warning(f"Prompt caching is off, Gemini cache client missing: {e}")
+            return None
+    if backend == "local":
+        return LocalCacheBackend()
+    if backend == "off":
+        return None
+    raise ValueError(f"Unknown prompt cache backend: {backend}")
+
+
+class PromptCache:
+    """
+    Keeps one live cache of the system prompt per model
+
+    get() is cheap while the cache is fresh and only calls the backend to
+    create or extend it, so it is safe to call before every request. It blocks
+    during those calls; async callers run it in a thread.
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        backend: CacheBackend | None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.settings = get_settings()
+        self.clock = clock
+        self.system_prompt = system_prompt
+        self.backend = backend
+        # Only names from the Gemini backend exist on the provider's side
+        self.remote = isinstance(backend, GeminiCacheBackend)
+        self.entries: dict[str, CacheEntry] = {}
+        self.lock = threading.Lock()
+
+    def fresh(self, entry: CacheEntry | None, now: float) -> bool:
+        """Whether entry can be used as is (a failed creation: until its retry)"""
+        if entry is None:
+            return False
+        if entry.name is None:
+            return entry.expires_at > now
+        margin = self.settings.PROMPT_CACHE_REFRESH_MARGIN_SECONDS
+        return entry.expires_at - margin > now
+
+    def get(self, model: str) -> str | None:
+        """Name of a fresh cache of the system prompt for model, or None"""
+        if self.backend is None:
+            return None
+
+        now = self.clock()
+        entry = self.entries.get(model)
+        if not self.fresh(entry, now):
+            with self.lock:
+                entry = self.entries.get(model)
+                # Another thread may have renewed it while we waited
+                if not self.fresh(entry, now):
+                    entry = self.renew(model, entry, now)
+                    self.entries[model] = entry
+                    return entry.name
+
+        prompt_cache_counter.inc(
+            model=model, result="hit" if entry.name else "unavailable"
+        )
+        return entry.name
+
+    def renew(self, model: str, entry: CacheEntry | None, now: float) -> CacheEntry:
+        """Extend a cache that is about to expire, or create a new one"""
+        ttl = self.settings.PROMPT_CACHE_TTL_SECONDS
+        if entry and entry.name and entry.expires_at > now:
+            try:
+                self.backend.refresh(entry.name, ttl)
+                prompt_cache_counter.inc(model=model, result="refreshed")
+                return CacheEntry(entry.name, now + ttl)
+            except Exception as e:
+                # Possibly deleted on the provider's side; create a new one
+                logger.warning(f"Could not refresh prompt cache {entry.name}: {e}")
+
+        try:
+            name = self.backend.create(model, self.system_prompt, ttl)
+        except CacheRejectedError as e:
+            logger.warning(
+                f"{model} can't cache the extraction prompt, sending it in full: {e}"
+            )
+            prompt_cache_counter.inc(model=model, result="rejected")
+            return CacheEntry(None, math.inf)
+        except Exception as e:
+            retry = self.settings.PROMPT_CACHE_RETRY_SECONDS
+            logger.warning(
+                f"Could not create prompt cache for {model}, sending the full "
+                f"prompt for {retry:.0f}s: {e}"
+            )
+            prompt_cache_counter.inc(model=model, result="error")
+            return CacheEntry(None, now + retry)
+
+        prompt_cache_counter.inc(model=model, result="created")
+        logger.info(f"Created prompt cache {name} for {model}")
+        return CacheEntry(name, now + ttl)
+
+
+class FakeClock:
+    """Clock for the check command that only moves when told to"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FailingCacheBackend(LocalCacheBackend):
+    """Local backend whose creations fail with error until told otherwise"""
+
+    def __init__(self, error: Exception):
+        super().__init__()
+        self.error = error
+        self.attempts = 0
+
+    def create(self, model: str, system_prompt: str, ttl_seconds: int) -> str:
+        self.attempts += 1
+        if self.error:
+            raise self.error
+        return super().create(model, system_prompt, ttl_seconds)
+
+
+def run_check() -> list[str]:
+    """
+    Exercise PromptCache against the local backend
+
+    Returns:
+        Descriptions of the checks that failed
+    """
+    settings = get_settings()
+    ttl = settings.PROMPT_CACHE_TTL_SECONDS
+    margin = settings.PROMPT_CACHE_REFRESH_MARGIN_SECONDS
+    retry = settings.PROMPT_CACHE_RETRY_SECONDS
+    model = "check-model"
+    failures = []
+
+    def expect(description: str, ok: bool):
+        print(f"{'ok  ' if ok else 'FAIL'} {description}")
+        if not ok:
+            failures.append(description)
+
+    clock = FakeClock()
+    backend = LocalCacheBackend()
+    cache = PromptCache("system prompt", backend, clock=clock)
+    name = cache.get(model)
+    expect("first request creates the cache", name and backend.created == 1)
+    clock.now += 1
+    expect(
+        "later requests hit it",
+        cache.get(model) == name and backend.created == 1,
+    )
+    expect(
+        "other models get their own cache",
+        cache.get("other-model") != name and backend.created == 2,
+    )
+    clock.now = ttl - margin + 1
+    expect(
+        "it is extended shortly before expiring",
+        cache.get(model) == name and backend.refreshed == 1 and backend.created == 2,
+    )
+    clock.now += ttl + 1
+    expect(
+        "an expired cache is replaced",
+        cache.get(model) is not None and backend.created == 3,
+    )
+
+    clock = FakeClock()
+    backend = FailingCacheBackend(RuntimeError("unavailable"))
+    cache = PromptCache("system prompt", backend, clock=clock)
+    expect("a failed creation sends the full prompt", cache.get(model) is None)
+    clock.now = retry - 1
+    cache.get(model)
+    expect("it isn't retried before the retry delay", backend.attempts == 1)
+    backend.error = None
+    clock.now = retry + 1
+    expect(
+        "it is retried after the retry delay",
+        cache.get(model) is not None and backend.attempts == 2,
+    )
+
+    clock = FakeClock()
+    backend = FailingCacheBackend(CacheRejectedError("too few tokens"))
+    cache = PromptCache("system prompt", backend, clock=clock)
+    cache.get(model)
+    clock.now = retry * 10
+    cache.get(model)
+    expect("a rejected prompt is never retried", backend.attempts == 1)
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extraction prompt cache")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser(
+        "check", help="Verify cache hits, refreshes and retries on the local backend"
+    )
+    parser.parse_args()
+
+    failures = run_check()
+    if failures:
+        print(f"{len(failures)} check(s) failed")
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    main()
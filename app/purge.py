@@ -0,0 +1,116 @@
+"""Background purge of jobs marked DELETING"""
+
+import asyncio
+
+from sqlalchemy import delete, exists, select
+
+from app.cache import bump_data_version
+from app.database import AsyncSessionLocal
+from app.db_models import Job, JobStatus, TransactionDB
+from app.logger import logger
+from app.settings import get_settings
+
+
+class JobPurger:
+    """
+    Deletes the transactions of DELETING jobs in chunks, then the jobs
+
+    Each chunk is its own short transaction, so purging a large job never holds
+    locks on a large range of rows, and the job row is only deleted once none
+    of its transactions are left. Every API process runs a purger; rows are
+    claimed with SKIP LOCKED so concurrent purgers split the work. Reads
+    already hide the transactions of DELETING jobs, so the data version is
+    bumped once per purge rather than per chunk.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.wakeup = asyncio.Event()
+        self.purge_task: asyncio.Task | None = None
+
+    async def start(self):
+        self.purge_task = asyncio.create_task(self.purge_loop())
+
+    async def stop(self):
+        if self.purge_task:
+            self.purge_task.cancel()
+            try:
+                await self.purge_task
+            except asyncio.CancelledError:
+                pass
+
+    def wake(self):
+        """Start purging now instead of at the next interval"""
+        self.wakeup.set()
+
+    async def purge_loop(self):
+        while True:
+            try:
+                purged = await self.purge()
+                if purged:
+                    logger.info(f"Purged {purged} deleted job(s)")
+            except Exception as e:
+                logger.error(f"Error purging deleted jobs: {e}", exc_info=True)
+
+            try:
+                await asyncio.wait_for(
+                    self.wakeup.wait(), timeout=self.settings.PURGE_INTERVAL_SECONDS
+                )
+            except TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    async def purge(self) -> int:
+        """Purge every DELETING job, returning how many were removed"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Job.id).where(Job.status == JobStatus.DELETING)
+            )
+            job_ids = result.scalars().all()
+
+        purged = 0
+        for job_id in job_ids:
+            while await self.delete_transactions_chunk(job_id):
+                pass
+            if await self.has_transactions(job_id):
+                # The rest is locked by another purger, which deletes the job
+                # once it is done (or the next purge does)
+                continue
+
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    delete(Job).where(
+                        Job.id == job_id, Job.status == JobStatus.DELETING
+                    )
+                )
+                await session.commit()
+            purged += result.rowcount
+
+        if purged:
+            async with AsyncSessionLocal() as session:
+                await bump_data_version(session)
+                await session.commit()
+        return purged
+
+    async def has_transactions(self, job_id: str) -> bool:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(exists().where(TransactionDB.job_id == job_id))
+            )
+            return result.scalar_one()
+
+    async def delete_transactions_chunk(self, job_id: str) -> int:
+        """Delete up to PURGE_BATCH_SIZE of a job's transactions"""
+        chunk = (
+            select(TransactionDB.id)
+            .where(TransactionDB.job_id == job_id)
+            .limit(self.settings.PURGE_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                delete(TransactionDB).where(TransactionDB.id.in_(chunk))
+            )
+            await session.commit()
+        return result.rowcount
@@ -0,0 +1,38 @@
+"""Pluggable task queues that hand extraction tasks from the API to workers"""
+
+from app.queues.base import Delivery, TaskQueue
+from app.settings import get_settings
+
+
+def create_task_queue(backend: str | None = None) -> TaskQueue:
+    """
+    Create the task queue configured by QUEUE_BACKEND
+
+    Backends are imported lazily so deployments only load the client libraries
+    they actually use.
+
+    Args:
+        backend: Override for QUEUE_BACKEND ("kafka", "postgres" or "memory")
+
+    Returns:
+        Task queue instance
+    """
+    backend = backend or get_settings().QUEUE_BACKEND
+
+    if backend == "kafka":
+        from app.queues.kafka import KafkaTaskQueue
+
+        return KafkaTaskQueue()
+    if backend == "postgres":
+        from app.queues.postgres import PostgresTaskQueue
+
+        return PostgresTaskQueue()
+    if backend == "memory":
+        from app.queues.memory import MemoryTaskQueue
+
+        return MemoryTaskQueue()
+
+    raise ValueError(f"Unknown queue backend: {backend}")
+
+
+__all__ = ["Delivery", "TaskQueue", "create_task_queue"]
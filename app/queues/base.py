@@ -0,0 +1,459 @@
+"""Task queue interface and the execution policy shared by every backend"""
+
+import asyncio
+import base64
+import os
+import socket
+from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.circuit_breaker import CircuitOpenError
+from app.database import AsyncSessionLocal
+from app.db_models import Job, JobPayload, JobStatus
+from app.lanes import INTERACTIVE, LANES, lane_concurrency
+from app.logger import logger
+from app.settings import get_settings
+
+TaskHandler = Callable[[dict], Awaitable[None]]
+
+
+@dataclass
+class Delivery:
+    """A task handed to a worker, with its attempt number and backend metadata"""
+
+    task: dict
+    attempt: int = 1
+    ref: Any = field(default=None, repr=False)
+
+    @property
+    def task_id(self) -> str:
+        return self.task.get("task_id", "unknown")
+
+    @property
+    def lane(self) -> str:
+        return self.task.get("lane", INTERACTIVE)
+
+
+@dataclass
+class DeadLetter:
+    """A task that exhausted its attempts"""
+
+    task_id: str
+    filename: str | None
+    attempts: int | None
+    error: str | None
+
+
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff delay (seconds) before re-delivering a failed attempt"""
+    settings = get_settings()
+    delay = settings.TASK_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+    return min(delay, settings.TASK_RETRY_BACKOFF_MAX_SECONDS)
+
+
+def build_task(job: Job, pdf_content: bytes) -> dict:
+    """Rebuild an extraction task from a job and its stored PDF"""
+    return {
+        "task_id": job.id,
+        "filename": job.filename,
+        "lane": job.lane,
+        "pdf_content": base64.b64encode(pdf_content).decode("utf-8"),
+        "task_type": "extract_transactions",
+    }
+
+
+async def update_job(
+    task_id: str, status: JobStatus, owner: str | None = None, **fields
+) -> bool:
+    """
+    Update the status (and any other fields) of a job, unless it is being deleted
+
+    Args:
+        task_id: Job ID
+        status: New status
+        owner: If set, only update the job while no worker but owner leases it
+        fields: Other columns to set
+
+    Returns:
+        Whether the job was updated
+    """
+    query = update(Job).where(Job.id == task_id, Job.status != JobStatus.DELETING)
+    if owner is not None:
+        query = query.where(or_(Job.worker_id.is_(None), Job.worker_id == owner))
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(query.values(status=status, **fields))
+        await session.commit()
+    return result.rowcount == 1
+
+
+class TaskQueue(ABC):
+    """
+    Base class for task queue backends
+
+    Backends implement publishing, delivery and the retry/dead-letter transport.
+    The base class owns the execution policy: per-lane concurrency slots,
+    per-task timeouts, the retry versus dead-letter decision, and the reaper
+    that re-queues jobs whose worker stopped heartbeating.
+
+    Every enqueued PDF is also stored in job_payloads until its job completes,
+    so a job orphaned by a crashed worker can be re-queued.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        # Identifies this process in Job.worker_id while it holds a job's lease
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.running = False
+        # Per-lane slots bound in-flight tasks so one slow extraction doesn't block
+        # its lane, and bulk documents can't take capacity from small ones
+        self.slots = {lane: asyncio.Semaphore(lane_concurrency(lane)) for lane in LANES}
+        self.in_flight: set[asyncio.Task] = set()
+        self.handler: TaskHandler | None = None
+        # Consumption is paused while the extractor's circuit is open; trial
+        # permits let a few tasks through to probe a half-open circuit
+        self.paused = False
+        self.trial_permits = 0
+        self.flow = asyncio.Condition()
+
+    async def start(self):
+        """Open connections needed to enqueue tasks"""
+
+    async def stop(self):
+        """Stop consuming, wait for in-flight tasks and close connections"""
+        self.running = False
+        if self.in_flight:
+            await asyncio.gather(*self.in_flight, return_exceptions=True)
+
+    async def enqueue(self, task: dict):
+        """Store the task's PDF and queue the task for processing on its lane"""
+        await self.enqueue_many([task])
+
+    async def enqueue_many(self, tasks: list[dict]):
+        """Store the PDFs of many tasks in one statement and queue them all"""
+        if not tasks:
+            return
+
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                insert(JobPayload)
+                .values(
+                    [
+                        {
+                            "job_id": task["task_id"],
+                            "pdf_content": base64.b64decode(task["pdf_content"]),
+                        }
+                        for task in tasks
+                    ]
+                )
+                .on_conflict_do_nothing(index_elements=[JobPayload.job_id])
+            )
+            await session.commit()
+
+        await self.publish_many(tasks)
+
+    @abstractmethod
+    async def lag(self) -> int:
+        """Number of queued tasks not yet picked up by a worker"""
+
+    @abstractmethod
+    async def publish(self, task: dict):
+        """Hand a task to the transport for delivery on its lane"""
+
+    async def publish_many(self, tasks: list[dict]):
+        """Hand many tasks to the transport; backends override this to batch"""
+        for task in tasks:
+            await self.publish(task)
+
+    async def requeue(self, job: Job, pdf_content: bytes):
+        """Re-queue an orphaned job; runs inside the reaper's transaction"""
+        await self.publish(build_task(job, pdf_content))
+
+    async def run(self, handler: TaskHandler):
+        """Deliver tasks to handler, and reap expired leases, until stopped"""
+        self.handler = handler
+        self.running = True
+        await asyncio.gather(*self.consumers(), self.reap())
+
+    async def reap(self):
+        """Periodically re-queue jobs whose lease expired while PROCESSING"""
+        try:
+            while self.running:
+                try:
+                    reaped = await self.reap_expired_leases()
+                    if reaped:
+                        logger.warning(f"Re-queued {reaped} job(s) with expired leases")
+                except Exception as e:
+                    logger.error(f"Error reaping expired leases: {e}", exc_info=True)
+                await asyncio.sleep(self.settings.REAPER_INTERVAL_SECONDS)
+        except asyncio.CancelledError:
+            logger.info("Reaper task cancelled")
+
+    async def reap_expired_leases(self, batch_size: int = 100) -> int:
+        """
+        Reset PROCESSING jobs with an expired lease to PENDING and re-queue them
+
+        Rows are locked with SKIP LOCKED so concurrent reapers never re-queue the
+        same job, and the row lock is held until the task has been re-queued.
+        """
+        query = (
+            select(Job, JobPayload.pdf_content)
+            .join(JobPayload, JobPayload.job_id == Job.id)
+            .where(
+                Job.status == JobStatus.PROCESSING,
+                Job.lease_expires_at < datetime.now(timezone.utc),
+            )
+            .limit(batch_size)
+            .with_for_update(of=Job, skip_locked=True, key_share=True)
+        )
+
+        async with AsyncSessionLocal() as session:
+            expired = (await session.execute(query)).all()
+            for job, pdf_content in expired:
+                logger.warning(
+                    f"Lease on job {job.id} held by {job.worker_id} expired, re-queueing"
+                )
+                job.status = JobStatus.PENDING
+                job.worker_id = None
+                job.lease_expires_at = None
+                job.error_message = "Worker stopped responding, job re-queued"
+                await self.requeue(job, pdf_content)
+            await session.commit()
+
+        return len(expired)
+
+    @abstractmethod
+    def consumers(self) -> list[Awaitable[None]]:
+        """Coroutines that feed deliveries to dispatch() until stopped"""
+
+    async def ack(self, delivery: Delivery):
+        """
+        Drop the stored PDF once its job is completed
+
+        A task can also return without completing its job, e.g. a duplicate
+        delivery of a job another worker leases. That worker, or the reaper if
+        it dies, still needs the PDF.
+        """
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                delete(JobPayload).where(
+                    JobPayload.job_id == delivery.task_id,
+                    JobPayload.job_id.in_(
+                        select(Job.id).where(
+                            Job.id == delivery.task_id,
+                            Job.status == JobStatus.COMPLETED,
+                        )
+                    ),
+                )
+            )
+            await session.commit()
+
+    async def leased_elsewhere(self, task_id: str) -> bool:
+        """Whether another worker holds (or last held) the job's lease"""
+        async with AsyncSessionLocal() as session:
+            worker_id = await session.scalar(
+                select(Job.worker_id).where(Job.id == task_id)
+            )
+        return worker_id is not None and worker_id != self.worker_id
+
+    @abstractmethod
+    async def retry(self, delivery: Delivery, delay: float, error: str):
+        """Re-deliver a task after delay seconds with its attempt incremented"""
+
+    @abstractmethod
+    async def dead_letter(self, delivery: Delivery, error: str):
+        """Park a task that exhausted its attempts"""
+
+    @abstractmethod
+    async def list_dead_letters(self) -> list[DeadLetter]:
+        """List parked tasks"""
+
+    @abstractmethod
+    async def replay_dead_letters(
+        self, task_ids: set[str] | None = None, limit: int | None = None
+    ) -> int:
+        """Re-queue parked tasks whose job is still FAILED, returning the count"""
+
+    async def pause(self):
+        """Stop handing out tasks until probe() or resume()"""
+        async with self.flow:
+            self.paused = True
+            self.trial_permits = 0
+        await self.pause_transport()
+        logger.warning("Task consumption paused")
+
+    async def probe(self, permits: int):
+        """While paused, hand out up to permits tasks as trial calls"""
+        async with self.flow:
+            self.trial_permits = permits
+            self.flow.notify_all()
+        await self.resume_transport()
+        logger.info(f"Task consumption probing with {permits} trial task(s)")
+
+    async def resume(self):
+        """Hand out tasks at full speed again"""
+        async with self.flow:
+            self.paused = False
+            self.trial_permits = 0
+            self.flow.notify_all()
+        await self.resume_transport()
+        logger.info("Task consumption resumed")
+
+    async def pause_transport(self):
+        """Stop fetching from the transport; backends that prefetch override this"""
+
+    async def resume_transport(self):
+        """Resume fetching from the transport"""
+
+    async def acquire_slot(self, lane: str):
+        """Wait until consumption isn't paused, then for a free slot in a lane"""
+        async with self.flow:
+            await self.flow.wait_for(lambda: not self.paused or self.trial_permits > 0)
+            if self.paused:
+                self.trial_permits -= 1
+        await self.slots[lane].acquire()
+
+    def dispatch(self, delivery: Delivery):
+        """Run a delivery in the background; the caller must hold a lane slot"""
+        handle = asyncio.create_task(self.execute(delivery))
+        self.in_flight.add(handle)
+        handle.add_done_callback(self.in_flight.discard)
+
+    async def execute(self, delivery: Delivery):
+        """Process a delivery with a timeout, scheduling a retry if it fails"""
+        # Whether the delivery's outcome is durably recorded (acknowledged,
+        # re-queued or dead-lettered), so the transport may forget it
+        settled = False
+        try:
+            await asyncio.wait_for(
+                self.handler(delivery.task), timeout=self.settings.TASK_TIMEOUT_SECONDS
+            )
+        except CircuitOpenError as e:
+            # Rejected without reaching the extractor, so no attempt is used up
+            try:
+                await self.defer(delivery, self.settings.CIRCUIT_OPEN_SECONDS, str(e))
+                settled = True
+            except Exception as defer_error:
+                logger.error(
+                    f"Could not defer task {delivery.task_id}: {defer_error}",
+                    exc_info=True,
+                )
+        except Exception as e:
+            if isinstance(e, TimeoutError):
+                error = f"Timed out after {self.settings.TASK_TIMEOUT_SECONDS:.0f}s"
+            else:
+                error = str(e) or type(e).__name__
+            logger.error(
+                f"Error processing task {delivery.task_id} (attempt {delivery.attempt}): {error}",
+                exc_info=not isinstance(e, TimeoutError),
+            )
+            try:
+                await self.fail(delivery, error)
+                settled = True
+            except Exception as retry_error:
+                logger.error(
+                    f"Could not reschedule task {delivery.task_id}: {retry_error}",
+                    exc_info=True,
+                )
+        else:
+            # The results are saved; a leftover payload is only wasted space
+            settled = True
+            try:
+                await self.ack(delivery)
+            except Exception as ack_error:
+                logger.error(
+                    f"Could not acknowledge task {delivery.task_id}: {ack_error}",
+                    exc_info=True,
+                )
+        finally:
+            self.slots[delivery.lane].release()
+
+        if settled:
+            try:
+                await self.settle(delivery)
+            except Exception as settle_error:
+                logger.error(
+                    f"Could not settle task {delivery.task_id}: {settle_error}",
+                    exc_info=True,
+                )
+
+    async def settle(self, delivery: Delivery):
+        """
+        Called once a delivery's outcome is recorded; backends that must confirm
+        consumption (e.g. by committing an offset) override this
+
+        Deliveries that are never settled, because the worker stopped or
+        recording the outcome failed, are delivered again.
+        """
+
+    async def defer(self, delivery: Delivery, delay: float, reason: str) -> bool:
+        """
+        Re-deliver a task after delay seconds without counting an attempt
+
+        Returns:
+            False if another worker has taken over the job, which is left alone
+        """
+        if await self.leased_elsewhere(delivery.task_id):
+            logger.warning(
+                f"Not deferring task {delivery.task_id}: its job is leased by another worker"
+            )
+            return False
+        await self.retry(
+            Delivery(delivery.task, attempt=delivery.attempt - 1, ref=delivery.ref),
+            delay,
+            reason,
+        )
+        return await update_job(
+            delivery.task_id,
+            JobStatus.PENDING,
+            owner=self.worker_id,
+            error_message=f"Extraction paused, retrying in {delay:.0f}s: {reason}",
+            worker_id=None,
+            lease_expires_at=None,
+        )
+
+    async def fail(self, delivery: Delivery, error: str):
+        """
+        Retry a failed delivery, or dead-letter it once attempts are exhausted
+
+        A job another worker has taken over (after this worker's lease expired)
+        is left to that worker.
+        """
+        if await self.leased_elsewhere(delivery.task_id):
+            logger.warning(
+                f"Not rescheduling task {delivery.task_id}: its job is leased by another worker"
+            )
+            return
+
+        if delivery.attempt >= self.settings.TASK_MAX_ATTEMPTS:
+            await self.dead_letter(delivery, error)
+            logger.warning(
+                f"Task {delivery.task_id} exhausted {delivery.attempt} attempts, dead-lettered"
+            )
+            await update_job(
+                delivery.task_id,
+                JobStatus.FAILED,
+                owner=self.worker_id,
+                error_message=error,
+                completed_at=datetime.now(timezone.utc),
+                worker_id=None,
+                lease_expires_at=None,
+            )
+            return
+
+        delay = retry_delay(delivery.attempt)
+        await self.retry(delivery, delay, error)
+        logger.info(f"Task {delivery.task_id} scheduled for retry in {delay:.0f}s")
+        await update_job(
+            delivery.task_id,
+            JobStatus.PENDING,
+            owner=self.worker_id,
+            error_message=f"Attempt {delivery.attempt} failed, retrying in {delay:.0f}s: {error}",
+            worker_id=None,
+            lease_expires_at=None,
+        )
@@ -0,0 +1,433 @@
+"""Kafka task queue with per-lane topics, a delayed-retry topic and a dead-letter topic"""
+
+import asyncio
+import json
+import time
+from collections import defaultdict
+from collections.abc import Awaitable
+from contextlib import aclosing
+
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer, TopicPartition
+
+from app.database import AsyncSessionLocal
+from app.db_models import Job, JobStatus
+from app.lanes import LANES, lane_topic
+from app.logger import logger
+from app.queues.base import DeadLetter, Delivery, TaskQueue
+
+# Kafka message headers used for retry bookkeeping
+ATTEMPT_HEADER = "attempt"
+NOT_BEFORE_HEADER = "not-before-ms"
+ERROR_HEADER = "error"
+
+# While a consumer holds a message back it polls this often, well within
+# aiokafka's max_poll_interval_ms (5 minutes), so it stays in its group
+HOLD_POLL_SECONDS = 5.0
+
+
+def get_header(message, name: str) -> str | None:
+    """Return a decoded header value from a Kafka message, if present"""
+    for key, value in message.headers or ():
+        if key == name:
+            return value.decode("utf-8")
+    return None
+
+
+class OffsetTracker:
+    """
+    Commits a consumer's offsets only past messages whose outcome is recorded
+
+    Messages of a partition are processed concurrently and finish out of order,
+    so the committed offset is that of the oldest message still outstanding.
+    Messages held back (waiting for a slot, while paused, or until a retry is
+    due) count as outstanding, so a restart delivers them again.
+    """
+
+    def __init__(self, consumer: AIOKafkaConsumer):
+        self.consumer = consumer
+        # Outstanding messages by partition and offset
+        self.outstanding: dict[TopicPartition, dict[int, object]] = defaultdict(dict)
+        # Offset after the newest settled message, by partition
+        self.settled_until: dict[TopicPartition, int] = {}
+        self.committed: dict[TopicPartition, int] = {}
+
+    def track(self, message):
+        tp = TopicPartition(message.topic, message.partition)
+        # A message fetched again after a rebalance replaces the earlier copy
+        self.outstanding[tp][message.offset] = message
+
+    async def settle(self, message):
+        tp = TopicPartition(message.topic, message.partition)
+        if self.outstanding[tp].get(message.offset) is not message:
+            # Superseded by a copy fetched again after a rebalance
+            return
+        outstanding = self.outstanding[tp]
+        oldest = min(outstanding)
+        del outstanding[message.offset]
+        self.settled_until[tp] = max(self.settled_until.get(tp, 0), message.offset + 1)
+        if message.offset != oldest:
+            # Older messages are still outstanding, so the offset can't advance
+            return
+
+        offset = min(outstanding) if outstanding else self.settled_until[tp]
+        if offset <= self.committed.get(tp, -1):
+            return
+        try:
+            await self.consumer.commit({tp: offset})
+            self.committed[tp] = offset
+        except Exception as e:
+            # Typically the partition moved to another consumer, which will
+            # deliver the uncommitted messages again
+            logger.warning(f"Could not commit offset {offset} of {tp}: {e}")
+
+
+class KafkaTaskQueue(TaskQueue):
+    """Task queue backed by Kafka topics"""
+
+    def __init__(self):
+        super().__init__()
+        self.producer = None
+        self.consumers_by_lane: dict[str, AIOKafkaConsumer] = {}
+        self.retry_consumer = None
+        # Offset trackers by topic
+        self.trackers: dict[str, OffsetTracker] = {}
+        # Never subscribes; only reads the worker group's committed offsets
+        self.lag_consumer = None
+
+    def _consumer(self, *topics: str, group_id: str | None) -> AIOKafkaConsumer:
+        return AIOKafkaConsumer(
+            *topics,
+            bootstrap_servers=self.settings.KAFKA_BOOTSTRAP_SERVERS,
+            group_id=group_id,
+            auto_offset_reset="earliest",
+            # Offsets are committed by OffsetTracker once a task is settled
+            enable_auto_commit=False,
+            value_deserializer=lambda m: json.loads(m.decode("utf-8")),
+        )
+
+    async def start(self):
+        """Start the Kafka producer"""
+        logger.info("Starting Kafka producer...")
+        self.producer = AIOKafkaProducer(
+            bootstrap_servers=self.settings.KAFKA_BOOTSTRAP_SERVERS,
+            value_serializer=lambda v: json.dumps(v).encode("utf-8"),
+        )
+        await self.producer.start()
+        logger.info("Kafka producer started")
+
+    async def stop(self):
+        """Stop the Kafka consumers and producer"""
+        await super().stop()
+        for client in (
+            *self.consumers_by_lane.values(),
+            self.retry_consumer,
+            self.lag_consumer,
+            self.producer,
+        ):
+            if client:
+                await client.stop()
+        self.consumers_by_lane = {}
+        self.retry_consumer = None
+        self.trackers = {}
+        self.lag_consumer = None
+        self.producer = None
+        logger.info("Kafka task queue stopped")
+
+    async def publish(self, task: dict):
+        """Send a task to its lane's topic, keyed by job ID"""
+        delivery = Delivery(task)
+        await self.producer.send(
+            lane_topic(delivery.lane),
+            value=task,
+            key=delivery.task_id.encode("utf-8"),
+        )
+
+    async def lag(self) -> int:
+        """Sum of end offset minus the worker group's committed offset over lane topics"""
+        if self.lag_consumer is None:
+            self.lag_consumer = AIOKafkaConsumer(
+                bootstrap_servers=self.settings.KAFKA_BOOTSTRAP_SERVERS,
+                group_id=self.settings.KAFKA_GROUP_ID,
+                enable_auto_commit=False,
+            )
+            await self.lag_consumer.start()
+
+        await self.lag_consumer.topics()  # Refresh cluster metadata
+        tps = [
+            TopicPartition(lane_topic(lane), partition)
+            for lane in LANES
+            for partition in self.lag_consumer.partitions_for_topic(lane_topic(lane))
+            or ()
+        ]
+        if not tps:
+            return 0
+
+        end_offsets = await self.lag_consumer.end_offsets(tps)
+        lag = 0
+        for tp in tps:
+            committed = await self.lag_consumer.committed(tp) or 0
+            lag += max(end_offsets[tp] - committed, 0)
+        return lag
+
+    async def publish_many(self, tasks: list[dict]):
+        """Append all tasks to the producer's batches, then wait for delivery once"""
+        deliveries = []
+        for task in tasks:
+            delivery = Delivery(task)
+            deliveries.append(
+                await self.producer.send(
+                    lane_topic(delivery.lane),
+                    value=task,
+                    key=delivery.task_id.encode("utf-8"),
+                )
+            )
+        await asyncio.gather(*deliveries)
+
+    async def run(self, handler):
+        """Start one consumer per lane plus the retry consumer and consume until stopped"""
+        logger.info(f"Connecting to Kafka at {self.settings.KAFKA_BOOTSTRAP_SERVERS}")
+
+        # One consumer per lane so a saturated bulk lane never stalls fetching
+        # for the interactive lane
+        self.consumers_by_lane = {
+            lane: self._consumer(
+                lane_topic(lane), group_id=self.settings.KAFKA_GROUP_ID
+            )
+            for lane in LANES
+        }
+        self.retry_consumer = self._consumer(
+            self.settings.KAFKA_RETRY_TOPIC,
+            group_id=f"{self.settings.KAFKA_GROUP_ID}-retry",
+        )
+        self.trackers = {
+            lane_topic(lane): OffsetTracker(consumer)
+            for lane, consumer in self.consumers_by_lane.items()
+        }
+        self.trackers[self.settings.KAFKA_RETRY_TOPIC] = OffsetTracker(
+            self.retry_consumer
+        )
+        for consumer in self._subscribed_consumers():
+            await consumer.start()
+
+        topics = [lane_topic(lane) for lane in LANES] + [
+            self.settings.KAFKA_RETRY_TOPIC
+        ]
+        logger.info(f"Started consuming from topics: {', '.join(topics)}")
+        await super().run(handler)
+
+    def consumers(self):
+        return [self.consume(lane) for lane in LANES] + [self.consume_retries()]
+
+    def _subscribed_consumers(self) -> list[AIOKafkaConsumer]:
+        return [
+            consumer
+            for consumer in (*self.consumers_by_lane.values(), self.retry_consumer)
+            if consumer
+        ]
+
+    async def pause_transport(self):
+        """
+        Pause fetching on every assigned partition
+
+        Nothing past the messages already fetched is consumed. A consumer that
+        is waiting to hand out a message keeps polling its paused partitions
+        (see hold), so it stays in its group and keeps its partitions. Fetched
+        messages held back by the pause stay uncommitted until they are settled.
+        """
+        for consumer in self._subscribed_consumers():
+            consumer.pause(*consumer.assignment())
+
+    async def resume_transport(self):
+        for consumer in self._subscribed_consumers():
+            consumer.resume(*consumer.paused())
+
+    async def hold(self, consumer: AIOKafkaConsumer, waiting: Awaitable[None]):
+        """
+        Await waiting (a free slot, the circuit closing) while staying in the group
+
+        aiokafka leaves the group, and gives up its partitions, once no poll has
+        run for max_poll_interval_ms. So while the message is held back the
+        consumer's partitions are paused and getmany() keeps polling them. Any
+        message it still returns (a partition resumed or newly assigned
+        meanwhile) is sought back to, to be fetched again later.
+        """
+        task = asyncio.ensure_future(waiting)
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=HOLD_POLL_SECONDS)
+                if done:
+                    return task.result()
+                consumer.pause(*consumer.assignment())
+                batch = await consumer.getmany(timeout_ms=0)
+                for tp, messages in batch.items():
+                    consumer.seek(tp, messages[0].offset)
+        finally:
+            task.cancel()
+            if not self.paused or self.trial_permits:
+                consumer.resume(*consumer.paused())
+
+    async def consume(self, lane: str):
+        """Consume messages from a lane's topic and dispatch them"""
+        consumer = self.consumers_by_lane[lane]
+        try:
+            async for message in consumer:
+                if not self.running:
+                    break
+                self.trackers[message.topic].track(message)
+
+                logger.info(
+                    f"Received {lane} message from partition {message.partition}, offset {message.offset}"
+                )
+                if self.paused and not self.trial_permits:
+                    # Partitions assigned by a rebalance since the pause
+                    await self.pause_transport()
+                await self.hold(consumer, self.acquire_slot(lane))
+                self.dispatch(Delivery(message.value, attempt=1, ref=message))
+        except asyncio.CancelledError:
+            logger.info(f"Consumer task for {lane} lane cancelled")
+
+    async def consume_retries(self):
+        """
+        Consume messages from the retry topic, holding each until it is due
+
+        Retries are delivered in the order they were scheduled, so waiting on the
+        head of the retry partition only delays other retries, never fresh tasks.
+        The wait pauses the retry partitions and keeps polling them, see hold.
+        """
+        try:
+            async for message in self.retry_consumer:
+                if not self.running:
+                    break
+                self.trackers[message.topic].track(message)
+
+                attempt = int(get_header(message, ATTEMPT_HEADER) or 1)
+                not_before_ms = int(get_header(message, NOT_BEFORE_HEADER) or 0)
+                wait_seconds = (not_before_ms - time.time() * 1000) / 1000
+                if wait_seconds > 0:
+                    # Backoffs run up to TASK_RETRY_BACKOFF_MAX_SECONDS, longer
+                    # than the consumer may go without polling
+                    await self.hold(self.retry_consumer, asyncio.sleep(wait_seconds))
+
+                delivery = Delivery(message.value, attempt=attempt, ref=message)
+                logger.info(
+                    f"Re-delivering task {delivery.task_id} (attempt {attempt})"
+                )
+                await self.hold(self.retry_consumer, self.acquire_slot(delivery.lane))
+                self.dispatch(delivery)
+        except asyncio.CancelledError:
+            logger.info("Retry consumer task cancelled")
+
+    async def settle(self, delivery: Delivery):
+        """Commit the delivery's offset once every earlier message is settled too"""
+        message = delivery.ref
+        tracker = self.trackers.get(message.topic) if message is not None else None
+        if tracker:
+            await tracker.settle(message)
+
+    async def retry(self, delivery: Delivery, delay: float, error: str):
+        """Send a task to the retry topic with its next attempt and due time"""
+        not_before_ms = int((time.time() + delay) * 1000)
+        await self.producer.send_and_wait(
+            self.settings.KAFKA_RETRY_TOPIC,
+            value=delivery.task,
+            key=delivery.task_id.encode("utf-8"),
+            headers=[
+                (ATTEMPT_HEADER, str(delivery.attempt + 1).encode("utf-8")),
+                (NOT_BEFORE_HEADER, str(not_before_ms).encode("utf-8")),
+                (ERROR_HEADER, error.encode("utf-8")),
+            ],
+        )
+
+    async def dead_letter(self, delivery: Delivery, error: str):
+        """Send a task to the dead-letter topic"""
+        await self.producer.send_and_wait(
+            self.settings.KAFKA_DLQ_TOPIC,
+            value=delivery.task,
+            key=delivery.task_id.encode("utf-8"),
+            headers=[
+                (ATTEMPT_HEADER, str(delivery.attempt).encode("utf-8")),
+                (ERROR_HEADER, error.encode("utf-8")),
+            ],
+        )
+
+    async def read_dead_letters(self):
+        """Yield every message currently in the dead-letter topic"""
+        consumer = self._consumer(group_id=None)
+        await consumer.start()
+        try:
+            await consumer.topics()  # Refresh cluster metadata
+            partitions = (
+                consumer.partitions_for_topic(self.settings.KAFKA_DLQ_TOPIC) or set()
+            )
+            tps = [TopicPartition(self.settings.KAFKA_DLQ_TOPIC, p) for p in partitions]
+            if not tps:
+                return
+
+            consumer.assign(tps)
+            await consumer.seek_to_beginning(*tps)
+            end_offsets = await consumer.end_offsets(tps)
+
+            remaining = {tp for tp in tps if end_offsets[tp] > 0}
+            while remaining:
+                batch = await consumer.getmany(*remaining, timeout_ms=1000)
+                for tp, messages in batch.items():
+                    for message in messages:
+                        if message.offset < end_offsets[tp]:
+                            yield message
+                for tp in list(remaining):
+                    if await consumer.position(tp) >= end_offsets[tp]:
+                        remaining.discard(tp)
+        finally:
+            await consumer.stop()
+
+    async def list_dead_letters(self) -> list[DeadLetter]:
+        dead_letters = []
+        async for message in self.read_dead_letters():
+            attempts = get_header(message, ATTEMPT_HEADER)
+            dead_letters.append(
+                DeadLetter(
+                    task_id=message.value.get("task_id"),
+                    filename=message.value.get("filename"),
+                    attempts=int(attempts) if attempts else None,
+                    error=get_header(message, ERROR_HEADER),
+                )
+            )
+        return dead_letters
+
+    async def replay_dead_letters(self, task_ids=None, limit=None) -> int:
+        """
+        Re-publish dead-lettered tasks to their lane's topic with a fresh attempt counter
+
+        Only tasks whose job is still FAILED are replayed, so replaying twice
+        never queues the same job twice.
+        """
+        replayed = 0
+        async with aclosing(self.read_dead_letters()) as messages:
+            async for message in messages:
+                if limit is not None and replayed >= limit:
+                    break
+
+                delivery = Delivery(message.value)
+                if task_ids and delivery.task_id not in task_ids:
+                    continue
+
+                # Hold the job row lock until the task is re-published, so the
+                # worker that receives it sees the job as PENDING
+                async with AsyncSessionLocal() as session:
+                    job = await session.get(
+                        Job, delivery.task_id, with_for_update={"key_share": True}
+                    )
+                    if not job or job.status != JobStatus.FAILED:
+                        continue
+
+                    job.status = JobStatus.PENDING
+                    job.completed_at = None
+                    job.error_message = None
+                    await self.enqueue(delivery.task)
+                    await session.commit()
+
+                logger.info(f"Replayed dead-lettered task {delivery.task_id}")
+                replayed += 1
+
+        await self.producer.flush()
+        return replayed
@@ -0,0 +1,91 @@
+"""In-process asyncio task queue for tests and broker-less local runs"""
+
+import asyncio
+
+from app.db_models import JobStatus
+from app.lanes import LANES
+from app.logger import logger
+from app.queues.base import DeadLetter, Delivery, TaskQueue, update_job
+
+
+class MemoryTaskQueue(TaskQueue):
+    """
+    Task queue backed by one asyncio.Queue per lane
+
+    Only works when the API and the worker share a process, and nothing
+    survives a restart.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.queues = {lane: asyncio.Queue() for lane in LANES}
+        self.dead_letters: dict[str, tuple[dict, DeadLetter]] = {}
+        self.timers: set[asyncio.TimerHandle] = set()
+
+    async def stop(self):
+        """Cancel pending retries and stop consuming"""
+        for timer in self.timers:
+            timer.cancel()
+        self.timers.clear()
+        await super().stop()
+
+    async def publish(self, task: dict):
+        delivery = Delivery(task)
+        self.queues[delivery.lane].put_nowait(delivery)
+
+    async def lag(self) -> int:
+        return sum(queue.qsize() for queue in self.queues.values())
+
+    def consumers(self):
+        return [self.consume(lane) for lane in LANES]
+
+    async def consume(self, lane: str):
+        """Dispatch queued deliveries for a lane whenever a slot is free"""
+        try:
+            while self.running:
+                delivery = await self.queues[lane].get()
+                await self.acquire_slot(lane)
+                self.dispatch(delivery)
+        except asyncio.CancelledError:
+            logger.info(f"Consumer task for {lane} lane cancelled")
+
+    async def retry(self, delivery: Delivery, delay: float, error: str):
+        """Re-queue the task once delay seconds have passed"""
+        retried = Delivery(delivery.task, attempt=delivery.attempt + 1)
+
+        def requeue():
+            self.timers.discard(timer)
+            self.queues[retried.lane].put_nowait(retried)
+
+        timer = asyncio.get_running_loop().call_later(delay, requeue)
+        self.timers.add(timer)
+
+    async def dead_letter(self, delivery: Delivery, error: str):
+        self.dead_letters[delivery.task_id] = (
+            delivery.task,
+            DeadLetter(
+                task_id=delivery.task_id,
+                filename=delivery.task.get("filename"),
+                attempts=delivery.attempt,
+                error=error,
+            ),
+        )
+
+    async def list_dead_letters(self) -> list[DeadLetter]:
+        return [dead_letter for _, dead_letter in self.dead_letters.values()]
+
+    async def replay_dead_letters(self, task_ids=None, limit=None) -> int:
+        replayed = 0
+        for task_id in list(self.dead_letters):
+            if limit is not None and replayed >= limit:
+                break
+            if task_ids and task_id not in task_ids:
+                continue
+
+            task, _ = self.dead_letters.pop(task_id)
+            await update_job(
+                task_id, JobStatus.PENDING, completed_at=None, error_message=None
+            )
+            await self.enqueue(task)
+            replayed += 1
+        return replayed
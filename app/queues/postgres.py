@@ -0,0 +1,219 @@
+"""Postgres task queue that claims jobs straight from the jobs table"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, func, or_, select, update
+
+from app.database import AsyncSessionLocal
+from app.db_models import Job, JobPayload, JobStatus
+from app.lanes import LANES
+from app.logger import logger
+from app.queues.base import DeadLetter, Delivery, TaskQueue, build_task
+
+
+class PostgresTaskQueue(TaskQueue):
+    """
+    Task queue backed by the jobs table
+
+    Workers claim claimable jobs with FOR UPDATE SKIP LOCKED, so concurrent
+    workers never contend for the same row. A claim takes a lease; a job whose
+    lease expired while PROCESSING is claimable again.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # Wakes the lane's consumer immediately when this process enqueues
+        self.wakeups = {lane: asyncio.Event() for lane in LANES}
+
+    async def publish(self, task: dict):
+        """Make the task's job claimable; its PDF is already in job_payloads"""
+        await self.publish_many([task])
+
+    async def publish_many(self, tasks: list[dict]):
+        """Make the jobs claimable with one UPDATE per lane"""
+        task_ids_by_lane: dict[str, list[str]] = {}
+        for task in tasks:
+            delivery = Delivery(task)
+            task_ids_by_lane.setdefault(delivery.lane, []).append(delivery.task_id)
+
+        async with AsyncSessionLocal() as session:
+            for lane, task_ids in task_ids_by_lane.items():
+                await session.execute(
+                    update(Job)
+                    .where(Job.id.in_(task_ids))
+                    .values(lane=lane, available_at=func.now())
+                )
+            await session.commit()
+
+        for lane in task_ids_by_lane:
+            self.wakeups[lane].set()
+
+    async def requeue(self, job: Job, pdf_content: bytes):
+        """The reaper's own update of the job row makes it claimable again"""
+        job.available_at = datetime.now(timezone.utc)
+        self.wakeups[job.lane].set()
+
+    async def lag(self) -> int:
+        """Count jobs that are due but not yet claimed"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(func.count(Job.id)).where(
+                    Job.status == JobStatus.PENDING,
+                    Job.available_at <= datetime.now(timezone.utc),
+                )
+            )
+            return result.scalar_one()
+
+    def consumers(self):
+        return [self.consume(lane) for lane in LANES]
+
+    async def consume(self, lane: str):
+        """Claim and dispatch jobs for a lane whenever a slot is free"""
+        try:
+            while self.running:
+                await self.acquire_slot(lane)
+                self.wakeups[lane].clear()
+
+                try:
+                    delivery = await self.claim(lane)
+                except Exception as e:
+                    logger.error(f"Error claiming {lane} job: {e}", exc_info=True)
+                    delivery = None
+
+                if delivery is None:
+                    self.slots[lane].release()
+                    try:
+                        await asyncio.wait_for(
+                            self.wakeups[lane].wait(),
+                            timeout=self.settings.QUEUE_POLL_INTERVAL_SECONDS,
+                        )
+                    except TimeoutError:
+                        pass
+                    continue
+
+                self.dispatch(delivery)
+        except asyncio.CancelledError:
+            logger.info(f"Consumer task for {lane} lane cancelled")
+
+    async def claim(self, lane: str) -> Delivery | None:
+        """Claim the oldest due job in a lane, or return None if there is none"""
+        now = datetime.now(timezone.utc)
+        query = (
+            select(Job)
+            .where(
+                Job.lane == lane,
+                Job.available_at <= now,
+                or_(
+                    Job.status == JobStatus.PENDING,
+                    and_(
+                        Job.status == JobStatus.PROCESSING,
+                        Job.lease_expires_at < now,
+                    ),
+                ),
+            )
+            .order_by(Job.available_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+
+        async with AsyncSessionLocal() as session:
+            job = (await session.execute(query)).scalar_one_or_none()
+            if job is None:
+                return None
+
+            payload = await session.get(JobPayload, job.id)
+            if payload is None:
+                logger.error(f"Job {job.id} has no stored PDF, marking it failed")
+                job.status = JobStatus.FAILED
+                job.completed_at = now
+                job.error_message = "PDF content is missing"
+                await session.commit()
+                return None
+
+            job.status = JobStatus.PROCESSING
+            job.attempts += 1
+            job.worker_id = self.worker_id
+            job.lease_expires_at = now + timedelta(
+                seconds=self.settings.JOB_LEASE_SECONDS
+            )
+            await session.commit()
+
+            return Delivery(build_task(job, payload.pdf_content), attempt=job.attempts)
+
+    async def retry(self, delivery: Delivery, delay: float, error: str):
+        """Hold the job back until its retry is due"""
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(Job)
+                .where(Job.id == delivery.task_id)
+                .values(
+                    available_at=datetime.now(timezone.utc) + timedelta(seconds=delay)
+                )
+            )
+            await session.commit()
+
+    async def defer(self, delivery: Delivery, delay: float, reason: str) -> bool:
+        """Hold the job back like a retry, and give back the attempt its claim took"""
+        if not await super().defer(delivery, delay, reason):
+            return False
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(Job)
+                .where(Job.id == delivery.task_id, Job.attempts > 0)
+                .values(attempts=Job.attempts - 1)
+            )
+            await session.commit()
+        return True
+
+    async def dead_letter(self, delivery: Delivery, error: str):
+        """FAILED jobs keep their stored PDF, which is all a dead letter needs"""
+
+    def _dead_letter_query(self):
+        return (
+            select(Job)
+            .join(JobPayload, JobPayload.job_id == Job.id)
+            .where(Job.status == JobStatus.FAILED)
+            .order_by(Job.completed_at)
+        )
+
+    async def list_dead_letters(self) -> list[DeadLetter]:
+        async with AsyncSessionLocal() as session:
+            jobs = (await session.execute(self._dead_letter_query())).scalars().all()
+        return [
+            DeadLetter(
+                task_id=job.id,
+                filename=job.filename,
+                attempts=job.attempts,
+                error=job.error_message,
+            )
+            for job in jobs
+        ]
+
+    async def replay_dead_letters(self, task_ids=None, limit=None) -> int:
+        """Make FAILED jobs with a stored PDF claimable again with a fresh attempt counter"""
+        ids_query = self._dead_letter_query().with_only_columns(Job.id)
+        if task_ids:
+            ids_query = ids_query.where(Job.id.in_(task_ids))
+        if limit is not None:
+            ids_query = ids_query.limit(limit)
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(Job)
+                .where(Job.id.in_(ids_query.scalar_subquery()))
+                .values(
+                    status=JobStatus.PENDING,
+                    attempts=0,
+                    available_at=func.now(),
+                    worker_id=None,
+                    lease_expires_at=None,
+                    completed_at=None,
+                    error_message=None,
+                )
+            )
+            await session.commit()
+
+        for wakeup in self.wakeups.values():
+            wakeup.set()
+        return result.rowcount
@@ -0,0 +1,132 @@
+"""
+Vectorized detection of recurring payments and subscriptions
+
+pandas and NumPy are imported on first use so that processes which never run
+the analysis, such as the API between requests to /spending/recurring, don't
+pay for loading them.
+"""
+
+# (name, typical days between payments, tolerance in days)
+PERIODS = (
+    ("weekly", 7, 1),
+    ("biweekly", 14, 2),
+    ("monthly", 30.4, 4),
+    ("quarterly", 91.3, 8),
+    ("yearly", 365.25, 15),
+)
+
+MIN_OCCURRENCES = 3
+# Maximum coefficient of variation of the gaps between payments
+MAX_INTERVAL_VARIATION = 0.25
+# Maximum coefficient of variation of the amounts for a recurring bill, and
+# for a fixed-price subscription
+MAX_AMOUNT_VARIATION = 0.35
+MAX_SUBSCRIPTION_AMOUNT_VARIATION = 0.05
+
+COLUMNS = ["merchant_key", "currency", "date", "amount", "title", "category"]
+
+SECONDS_PER_DAY = 86400
+
+
+def detect_recurring(records: list):
+    """
+    Find merchants that are paid at a regular interval
+
+    Rows are grouped by (merchant_key, currency) and each group is summarized
+    with whole-column operations; no Python code runs per transaction or per
+    group.
+
+    Args:
+        records: One tuple per transaction with the columns in COLUMNS
+
+    Returns:
+        A pandas DataFrame with one row per recurring merchant, most recent
+        first, with the period, interval and amount statistics and the next
+        expected payment date
+    """
+    import numpy as np
+    import pandas as pd
+
+    df = pd.DataFrame.from_records(records, columns=COLUMNS)
+    df = df[df["merchant_key"].fillna("") != ""]
+    if df.empty:
+        return pd.DataFrame()
+
+    # Integer group ids sort and group far faster than the string keys
+    merchant_codes, merchants = pd.factorize(df["merchant_key"])
+    currency_codes, currencies = pd.factorize(df["currency"])
+    group = merchant_codes.astype(np.int64) * len(currencies) + currency_codes
+
+    dates = (
+        pd.to_datetime(df["date"], utc=True)
+        .dt.tz_localize(None)
+        .to_numpy(dtype="datetime64[s]")
+        .astype(np.int64)
+    )
+    order = np.lexsort((dates, group))
+    group, dates = group[order], dates[order]
+
+    # Days since the previous payment to the same merchant; NaN for the first
+    gap = np.empty(len(dates))
+    gap[0] = np.nan
+    gap[1:] = np.diff(dates) / SECONDS_PER_DAY
+    gap[1:][group[1:] != group[:-1]] = np.nan
+
+    rows = pd.DataFrame(
+        {
+            "group": group,
+            "gap": gap,
+            "amount": df["amount"].to_numpy(dtype=np.float64)[order],
+            "date": dates,
+            "position": order,
+        }
+    )
+    summary = rows.groupby("group", sort=False).agg(
+        occurrences=("amount", "size"),
+        average_amount=("amount", "mean"),
+        amount_std=("amount", "std"),
+        median_interval=("gap", "median"),
+        interval_mean=("gap", "mean"),
+        interval_std=("gap", "std"),
+        first_date=("date", "first"),
+        last_date=("date", "last"),
+        last_position=("position", "last"),
+    )
+
+    summary["amount_variation"] = (
+        summary["amount_std"].fillna(0) / summary["average_amount"].abs()
+    ).replace([np.inf, -np.inf], np.nan)
+    summary["interval_variation"] = (
+        summary["interval_std"].fillna(0) / summary["interval_mean"]
+    ).replace([np.inf, -np.inf], np.nan)
+
+    interval = summary["median_interval"].to_numpy()
+    matches = [np.abs(interval - days) <= tolerance for _, days, tolerance in PERIODS]
+    summary["period"] = np.select(matches, [name for name, _, _ in PERIODS], None)
+
+    recurring = summary[
+        (summary["occurrences"] >= MIN_OCCURRENCES)
+        & summary["period"].notna()
+        & (summary["interval_variation"] <= MAX_INTERVAL_VARIATION)
+        & (summary["amount_variation"] <= MAX_AMOUNT_VARIATION)
+    ].copy()
+
+    # Only now touch the string columns, for the few recurring merchants
+    group_ids = recurring.index.to_numpy()
+    last_positions = recurring["last_position"].to_numpy()
+    recurring["merchant_key"] = merchants[group_ids // len(currencies)]
+    recurring["currency"] = currencies[group_ids % len(currencies)]
+    recurring["title"] = df["title"].to_numpy()[last_positions]
+    recurring["category"] = df["category"].to_numpy()[last_positions]
+    recurring["is_subscription"] = (
+        recurring["amount_variation"] <= MAX_SUBSCRIPTION_AMOUNT_VARIATION
+    )
+    for column in ("first_date", "last_date"):
+        recurring[column] = pd.to_datetime(recurring[column], unit="s", utc=True)
+    recurring["next_expected_date"] = recurring["last_date"] + pd.to_timedelta(
+        recurring["median_interval"], unit="D"
+    )
+
+    return recurring.drop(
+        columns=["amount_std", "interval_mean", "interval_std", "last_position"]
+    ).sort_values("last_date", ascending=False, ignore_index=True)
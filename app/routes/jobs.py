@@ -1,19 +1,143 @@
 """Job-related API routes"""
 
+import asyncio
 import base64
+import io
+import posixpath
 import uuid
+import zipfile
+from datetime import datetime, timedelta, timezone
+from typing import Literal
 
 from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile
-from sqlalchemy import delete, select
+from sqlalchemy import case, delete, func, insert, literal, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api_models import JobResponse, UploadResponse
-from app.database import get_db
+from app.api_models import (
+    BatchProgressResponse,
+    BatchUploadResponse,
+    BulkDeleteRequest,
+    BulkDeleteResponse,
+    JobResponse,
+    JobStatsBucket,
+    JobStatsResponse,
+    UploadResponse,
+)
+from app.cache import bump_data_version
+from app.database import get_db, get_read_db
 from app.db_models import Job, JobStatus, TransactionDB
+from app.lanes import choose_lane
 from app.logger import logger
+from app.pdf import count_pages
+from app.settings import get_settings
 
 router = APIRouter(tags=["jobs"])
 
+# Uploads are read in chunks of this size so batch limits apply while reading
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+def build_extraction_task(job_id: str, filename: str, pdf_content: bytes) -> dict:
+    """Create an extraction task, routing small documents to the interactive lane"""
+    return {
+        "task_id": job_id,
+        "filename": filename,
+        "lane": choose_lane(len(pdf_content), count_pages(pdf_content)),
+        "pdf_content": base64.b64encode(pdf_content).decode("utf-8"),
+        "task_type": "extract_transactions",
+    }
+
+
+def extract_zip_pdfs(
+    zip_content: bytes, max_bytes: int, max_files: int
+) -> list[tuple[str, bytes]]:
+    """
+    Extract the PDF files from a ZIP archive
+
+    The limits are checked against the archive's directory before anything is
+    decompressed.
+
+    Args:
+        zip_content: ZIP archive content as bytes
+        max_bytes: Maximum total uncompressed size of the extracted PDFs
+        max_files: Maximum number of PDFs in the archive
+
+    Returns:
+        List of (filename, content) pairs
+    """
+    documents = []
+    with zipfile.ZipFile(io.BytesIO(zip_content)) as archive:
+        entries = [
+            entry
+            for entry in archive.infolist()
+            if not entry.is_dir()
+            and entry.filename.lower().endswith(".pdf")
+            and not posixpath.basename(entry.filename).startswith(".")
+            and "__MACOSX/" not in entry.filename
+        ]
+        if len(entries) > max_files:
+            raise ValueError("ZIP archive contains too many PDFs for one batch")
+        if sum(entry.file_size for entry in entries) > max_bytes:
+            raise ValueError("ZIP archive is too large once extracted")
+
+        for entry in entries:
+            filename = posixpath.basename(entry.filename)[-255:]
+            documents.append((filename, archive.read(entry)))
+    return documents
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> bytes:
+    """Read an uploaded file in chunks, giving up as soon as it exceeds max_bytes"""
+    if file.size is not None and file.size > max_bytes:
+        raise ValueError("Batch is too large")
+    chunks = []
+    size = 0
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        size += len(chunk)
+        if size > max_bytes:
+            raise ValueError("Batch is too large")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def read_batch_documents(files: list[UploadFile]) -> list[tuple[str, bytes]]:
+    """
+    Read uploaded PDFs and expand ZIP archives, enforcing the batch limits
+
+    The limits are checked after every file, and each read stops once the
+    remaining byte budget is exceeded, so an oversized batch is rejected
+    without reading the rest of it.
+    """
+    settings = get_settings()
+    documents = []
+    remaining_bytes = settings.BATCH_MAX_BYTES
+    for file in files:
+        filename = file.filename or ""
+        if not filename.lower().endswith((".zip", ".pdf")):
+            raise ValueError(f"{filename} is not a PDF or ZIP file")
+
+        content = await read_upload(file, remaining_bytes)
+        if filename.lower().endswith(".zip"):
+            try:
+                extracted = await asyncio.to_thread(
+                    extract_zip_pdfs,
+                    content,
+                    remaining_bytes,
+                    settings.BATCH_MAX_FILES - len(documents),
+                )
+            except zipfile.BadZipFile:
+                raise ValueError(f"{filename} is not a valid ZIP archive")
+        else:
+            extracted = [(filename, content)]
+
+        documents.extend(extracted)
+        remaining_bytes -= sum(len(content) for _, content in extracted)
+        if len(documents) > settings.BATCH_MAX_FILES:
+            raise ValueError(
+                f"A batch can contain at most {settings.BATCH_MAX_FILES} PDFs"
+            )
+    return documents
+
 
 @router.post("/upload", response_model=UploadResponse)
 async def upload_pdf(
@@ -35,34 +159,37 @@ async def upload_pdf(
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are accepted")
 
-    try:
-        from app.settings import get_settings
+    # Reject with 429 + Retry-After when the queue is overloaded
+    client_id = await request.app.state.admission.admit(request)
 
-        settings = get_settings()
+    try:
         job_id = str(uuid.uuid4())
 
-        # Create job record in database
-        job = Job(id=job_id, filename=file.filename, status=JobStatus.PENDING)
+        # Read PDF content and create extraction task
+        pdf_content = await file.read()
+        task = await asyncio.to_thread(
+            build_extraction_task, job_id, file.filename, pdf_content
+        )
+
+        # Create job record in database, on the task's lane so a re-queued
+        # task goes back to the same lane
+        job = Job(
+            id=job_id,
+            filename=file.filename,
+            status=JobStatus.PENDING,
+            lane=task["lane"],
+            client_id=client_id,
+        )
         db.add(job)
         await db.commit()
 
-        # Read and encode PDF content
-        pdf_content = await file.read()
-        pdf_base64 = base64.b64encode(pdf_content).decode("utf-8")
-
-        # Create Kafka task
-        task = {
-            "task_id": job_id,
-            "filename": file.filename,
-            "pdf_content": pdf_base64,
-            "task_type": "extract_transactions",
-        }
+        # Queue task using the task queue from app state
+        task_queue = request.app.state.task_queue
+        await task_queue.enqueue(task)
 
-        # Send task to Kafka using producer from app state
-        kafka_producer = request.app.state.kafka_producer
-        await kafka_producer.send(settings.KAFKA_TOPIC, value=task)
-
-        logger.info(f"Queued PDF extraction job {job_id} for {file.filename}")
+        logger.info(
+            f"Queued PDF extraction job {job_id} for {file.filename} ({task['lane']})"
+        )
 
         return UploadResponse(
             job_id=job_id,
@@ -74,13 +201,142 @@ async def upload_pdf(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/upload/batch", response_model=BatchUploadResponse)
+async def upload_batch(
+    request: Request,
+    files: list[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Upload many PDFs, or ZIP archives of PDFs, as one batch
+
+    All jobs are created with a single insert and queued with batched sends.
+
+    Args:
+        request: FastAPI request object (for accessing app state)
+        files: PDF and/or ZIP file uploads
+        db: Database session
+
+    Returns:
+        Batch ID and the IDs of its jobs
+    """
+    try:
+        documents = await read_batch_documents(files)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not documents:
+        raise HTTPException(status_code=400, detail="No PDF files found in upload")
+
+    # Reject with 429 + Retry-After when the queue is overloaded
+    client_id = await request.app.state.admission.admit(request, len(documents))
+
+    try:
+        batch_id = str(uuid.uuid4())
+        # Counting pages and base64-encoding are CPU-bound, keep them off the
+        # event loop
+        tasks = await asyncio.gather(
+            *(
+                asyncio.to_thread(
+                    build_extraction_task, str(uuid.uuid4()), filename, content
+                )
+                for filename, content in documents
+            )
+        )
+
+        # Create all job records with one insert
+        await db.execute(
+            insert(Job),
+            [
+                {
+                    "id": task["task_id"],
+                    "filename": task["filename"],
+                    "status": JobStatus.PENDING,
+                    "lane": task["lane"],
+                    "batch_id": batch_id,
+                    "client_id": client_id,
+                }
+                for task in tasks
+            ],
+        )
+        await db.commit()
+
+        # Queue all tasks using the task queue from app state
+        task_queue = request.app.state.task_queue
+        await task_queue.enqueue_many(tasks)
+
+        logger.info(f"Queued batch {batch_id} with {len(tasks)} PDF extraction jobs")
+
+        return BatchUploadResponse(
+            batch_id=batch_id,
+            job_ids=[task["task_id"] for task in tasks],
+            status="queued",
+            message=f"Batch upload successful. {len(tasks)} jobs queued for processing.",
+        )
+    except Exception as e:
+        logger.error(f"Error uploading batch: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/batches/{batch_id}", response_model=BatchProgressResponse)
+async def get_batch(batch_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Get aggregate progress of a batch upload (jobs being deleted are left
+    out, so the batch is done once the rest are)
+
+    Args:
+        batch_id: Batch ID
+        db: Database session
+
+    Returns:
+        Job counts per status and total extracted transactions
+    """
+    try:
+        query = (
+            select(
+                Job.status,
+                func.count(Job.id).label("job_count"),
+                func.coalesce(func.sum(Job.transaction_count), 0).label(
+                    "transaction_count"
+                ),
+            )
+            .where(Job.batch_id == batch_id, Job.status != JobStatus.DELETING)
+            .group_by(Job.status)
+        )
+        result = await db.execute(query)
+        rows = result.all()
+        if not rows:
+            raise HTTPException(status_code=404, detail="Batch not found")
+
+        counts = {status: 0 for status in JobStatus}
+        for row in rows:
+            counts[row.status] = row.job_count
+        total = sum(counts.values())
+
+        return BatchProgressResponse(
+            batch_id=batch_id,
+            total=total,
+            pending=counts[JobStatus.PENDING],
+            processing=counts[JobStatus.PROCESSING],
+            completed=counts[JobStatus.COMPLETED],
+            failed=counts[JobStatus.FAILED],
+            transaction_count=sum(row.transaction_count for row in rows),
+            done=counts[JobStatus.COMPLETED] + counts[JobStatus.FAILED] == total,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching batch {batch_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/jobs", response_model=list[JobResponse])
 async def get_jobs(
     status: JobStatus | None = Query(None, description="Filter by job status"),
     db: AsyncSession = Depends(get_db),
 ):
     """
-    Get all jobs with optional status filter
+    Get all jobs with optional status filter (jobs being deleted are only
+    listed when filtering by DELETING)
 
     Args:
         status: Optional job status filter
@@ -93,6 +349,8 @@ async def get_jobs(
         query = select(Job).order_by(Job.created_at.desc())
         if status:
             query = query.where(Job.status == status)
+        else:
+            query = query.where(Job.status != JobStatus.DELETING)
 
         result = await db.execute(query)
         jobs = result.scalars().all()
@@ -103,6 +361,97 @@ async def get_jobs(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+BUCKET_SECONDS = {"hour": 3600, "day": 86400, "week": 604800}
+
+
+@router.get("/jobs/stats", response_model=JobStatsResponse)
+async def get_job_stats(
+    bucket: Literal["hour", "day", "week"] = Query(
+        "day", description="Time bucket size"
+    ),
+    days: int = Query(7, ge=1, le=366, description="How many days back to report"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Get throughput, latency percentiles and token spend of finished jobs per
+    time bucket, aggregated in one SQL query
+
+    Args:
+        bucket: Time bucket size (hour, day or week)
+        days: How many days back to report
+        db: Database session
+
+    Returns:
+        One entry per bucket with finished jobs, oldest first
+    """
+    try:
+        end = datetime.now(timezone.utc)
+        start = end - timedelta(days=days)
+
+        completed = Job.status == JobStatus.COMPLETED
+
+        def completed_seconds(expression):
+            # NULL for failed jobs, which percentile_cont ignores
+            return case((completed, expression))
+
+        def percentile(fraction: float, expression):
+            return func.percentile_cont(fraction).within_group(expression)
+
+        latency = completed_seconds(
+            func.extract("epoch", Job.completed_at - Job.created_at)
+        )
+        queue_wait = completed_seconds(
+            func.extract("epoch", Job.started_at - Job.created_at)
+        )
+        extraction = completed_seconds(Job.extraction_ms / 1000.0)
+        completed_count = func.count().filter(completed)
+
+        bucket_start = func.date_trunc(bucket, Job.completed_at)
+        query = (
+            select(
+                bucket_start.label("bucket_start"),
+                completed_count.label("completed"),
+                func.count().filter(Job.status == JobStatus.FAILED).label("failed"),
+                (completed_count * literal(3600.0 / BUCKET_SECONDS[bucket])).label(
+                    "jobs_per_hour"
+                ),
+                func.coalesce(func.sum(Job.transaction_count), 0).label(
+                    "transaction_count"
+                ),
+                func.coalesce(func.sum(Job.bytes_processed), 0).label(
+                    "bytes_processed"
+                ),
+                func.coalesce(func.sum(Job.bytes_saved), 0).label("bytes_saved"),
+                func.coalesce(func.sum(Job.input_tokens), 0).label("input_tokens"),
+                func.coalesce(func.sum(Job.output_tokens), 0).label("output_tokens"),
+                percentile(0.5, latency).label("latency_p50"),
+                percentile(0.95, latency).label("latency_p95"),
+                percentile(0.99, latency).label("latency_p99"),
+                percentile(0.5, queue_wait).label("queue_wait_p50"),
+                percentile(0.95, queue_wait).label("queue_wait_p95"),
+                percentile(0.5, extraction).label("extraction_p50"),
+                percentile(0.95, extraction).label("extraction_p95"),
+            )
+            .where(
+                Job.status.in_([JobStatus.COMPLETED, JobStatus.FAILED]),
+                Job.completed_at >= start,
+            )
+            .group_by("bucket_start")
+            .order_by("bucket_start")
+        )
+        result = await db.execute(query)
+
+        return JobStatsResponse(
+            bucket=bucket,
+            start=start,
+            end=end,
+            buckets=[JobStatsBucket(**row._mapping) for row in result.all()],
+        )
+    except Exception as e:
+        logger.error(f"Error computing job stats: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/jobs/{job_id}", response_model=JobResponse)
 async def get_job(job_id: str, db: AsyncSession = Depends(get_db)):
     """
@@ -150,6 +499,7 @@ async def delete_job(job_id: str, db: AsyncSession = Depends(get_db)):
         delete_stmt = delete(TransactionDB).where(TransactionDB.job_id == job_id)
         result = await db.execute(delete_stmt)
         transactions_deleted = result.rowcount
+        await bump_data_version(db)
 
         # Delete the job
         await db.delete(job)
@@ -170,3 +520,58 @@ async def delete_job(job_id: str, db: AsyncSession = Depends(get_db)):
         logger.error(f"Error deleting job {job_id}: {e}", exc_info=True)
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/jobs/delete", response_model=BulkDeleteResponse, status_code=202)
+async def delete_jobs(
+    request: Request, body: BulkDeleteRequest, db: AsyncSession = Depends(get_db)
+):
+    """
+    Delete many jobs by ID or filter
+
+    Matching jobs are marked DELETING with a single UPDATE and the request
+    returns immediately. Their transactions are purged in the background in
+    chunks, then the job rows are deleted.
+
+    Args:
+        request: FastAPI request (for accessing app state)
+        body: Job IDs and/or filters selecting the jobs
+        db: Database session
+
+    Returns:
+        IDs of the jobs marked for deletion
+    """
+    try:
+        query = update(Job).where(Job.status != JobStatus.DELETING)
+        if body.job_ids is not None:
+            query = query.where(Job.id.in_(body.job_ids))
+        if body.batch_id:
+            query = query.where(Job.batch_id == body.batch_id)
+        if body.status:
+            query = query.where(Job.status == body.status)
+        if body.created_before:
+            query = query.where(Job.created_at < body.created_before)
+
+        result = await db.execute(
+            query.values(
+                status=JobStatus.DELETING, worker_id=None, lease_expires_at=None
+            ).returning(Job.id)
+        )
+        job_ids = result.scalars().all()
+        if job_ids:
+            # Their transactions are hidden from now on
+            await bump_data_version(db)
+        await db.commit()
+
+        request.app.state.purger.wake()
+        logger.info(f"Marked {len(job_ids)} job(s) for deletion")
+
+        return BulkDeleteResponse(
+            job_ids=job_ids,
+            status="deleting",
+            message=f"{len(job_ids)} job(s) will be deleted in the background",
+        )
+    except Exception as e:
+        logger.error(f"Error deleting jobs: {e}", exc_info=True)
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
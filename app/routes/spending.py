@@ -1,5 +1,6 @@
 """Spending analysis API routes"""
 
+import asyncio
 from statistics import mean, stdev
 
 from fastapi import APIRouter, Depends, HTTPException, Query
@@ -10,29 +11,39 @@ from app.api_models import (
     CategorySpending,
     CategoryTrend,
     MonthlySpending,
+    RecurringPayment,
+    SpendingRollupNode,
     TopTransaction,
     UnusualTransaction,
 )
-from app.database import get_db
+from app.cache import VersionedCache, get_data_version
+from app.database import get_read_db
 from app.db_models import TransactionDB
+from app.filters import TransactionFilters
 from app.logger import logger
+from app.recurring import detect_recurring
 
 router = APIRouter(prefix="/spending", tags=["spending"])
 
+# Recurring payment analyses, valid until transactions next change
+recurring_cache = VersionedCache()
+
 
 @router.get("/analysis", response_model=list[MonthlySpending])
 async def get_spending_analysis(
     category_type: str = Query(
         "detailed", description="Category type: 'primary' or 'detailed'"
     ),
-    db: AsyncSession = Depends(get_db),
+    filters: TransactionFilters = Depends(),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     Get spending analysis by category per month
 
     Args:
         category_type: Type of category to group by (primary or detailed)
-        db: Database session
+        filters: Date, job, category and amount filters
+        db: Read-only database session
 
     Returns:
         List of monthly spending data grouped by category
@@ -57,6 +68,7 @@ async def get_spending_analysis(
             .group_by("year", "month", "category")
             .order_by("year", "month", "category")
         )
+        query = filters.apply(query, category_field)
 
         result = await db.execute(query)
         rows = result.all()
@@ -101,7 +113,8 @@ async def get_top_transactions(
     category_type: str = Query(
         "detailed", description="Category type: 'primary' or 'detailed'"
     ),
-    db: AsyncSession = Depends(get_db),
+    filters: TransactionFilters = Depends(),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     Get top spending transactions
@@ -109,7 +122,8 @@ async def get_top_transactions(
     Args:
         limit: Number of top transactions to return
         category_type: Type of category to include
-        db: Database session
+        filters: Date, job, category and amount filters
+        db: Read-only database session
 
     Returns:
         List of top transactions by amount
@@ -132,6 +146,7 @@ async def get_top_transactions(
             .order_by(TransactionDB.amount.desc())
             .limit(limit)
         )
+        query = filters.apply(query, category_field)
 
         result = await db.execute(query)
         rows = result.all()
@@ -162,7 +177,8 @@ async def get_unusual_transactions(
     category_type: str = Query(
         "detailed", description="Category type: 'primary' or 'detailed'"
     ),
-    db: AsyncSession = Depends(get_db),
+    filters: TransactionFilters = Depends(),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     Get unusual transactions (outliers based on amount)
@@ -171,7 +187,8 @@ async def get_unusual_transactions(
         threshold: Standard deviation threshold
         limit: Maximum number of results
         category_type: Type of category to use
-        db: Database session
+        filters: Date, job, category and amount filters
+        db: Read-only database session
 
     Returns:
         List of unusual transactions
@@ -191,6 +208,7 @@ async def get_unusual_transactions(
             TransactionDB.amount,
             category_field.label("category"),
         )
+        query = filters.apply(query, category_field)
 
         result = await db.execute(query)
         transactions = result.all()
@@ -245,7 +263,8 @@ async def get_category_trends(
         "detailed", description="Category type: 'primary' or 'detailed'"
     ),
     top_n: int = Query(5, ge=1, le=20, description="Number of top categories to show"),
-    db: AsyncSession = Depends(get_db),
+    filters: TransactionFilters = Depends(),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     Get spending trends by category over time
@@ -253,7 +272,8 @@ async def get_category_trends(
     Args:
         category_type: Type of category to group by
         top_n: Number of top categories to include
-        db: Database session
+        filters: Date, job, category and amount filters
+        db: Read-only database session
 
     Returns:
         List of category trends with monthly data
@@ -275,6 +295,7 @@ async def get_category_trends(
             .order_by(func.sum(TransactionDB.amount).desc())
             .limit(top_n)
         )
+        top_categories_query = filters.apply(top_categories_query, category_field)
 
         result = await db.execute(top_categories_query)
         top_categories = [row.category for row in result.all()]
@@ -292,6 +313,7 @@ async def get_category_trends(
                 .group_by("year", "month")
                 .order_by("year", "month")
             )
+            query = filters.apply(query, category_field)
 
             result = await db.execute(query)
             rows = result.all()
@@ -311,3 +333,170 @@ async def get_category_trends(
     except Exception as e:
         logger.error(f"Error fetching category trends: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/rollup", response_model=SpendingRollupNode)
+async def get_spending_rollup(
+    category_type: str = Query(
+        "detailed",
+        description="Category type the categories filter applies to: 'primary' or 'detailed'",
+    ),
+    filters: TransactionFilters = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Get spending per month, primary category and detailed category as a tree
+
+    Every level's subtotals and the grand total come from a single ROLLUP
+    query, so the dashboard needs one aggregation instead of one per category
+    type.
+
+    Args:
+        category_type: Which category field the categories filter applies to
+        filters: Date, job, category and amount filters
+        db: Read-only database session
+
+    Returns:
+        Grand total whose children are months, then primary, then detailed categories
+    """
+    try:
+        category_field = (
+            TransactionDB.category_primary
+            if category_type == "primary"
+            else TransactionDB.category_detailed
+        )
+        month = func.date_trunc("month", TransactionDB.date)
+
+        query = (
+            select(
+                month.label("month"),
+                TransactionDB.category_primary.label("primary"),
+                TransactionDB.category_detailed.label("detailed"),
+                func.grouping(month).label("month_total"),
+                func.grouping(TransactionDB.category_primary).label("primary_total"),
+                func.grouping(TransactionDB.category_detailed).label("detailed_total"),
+                func.sum(TransactionDB.amount).label("total_amount"),
+                func.count(TransactionDB.id).label("transaction_count"),
+            )
+            .group_by(
+                func.rollup(
+                    month,
+                    TransactionDB.category_primary,
+                    TransactionDB.category_detailed,
+                )
+            )
+            # Subtotal rows sort before the rows they summarize
+            .order_by(
+                month.asc().nulls_first(),
+                TransactionDB.category_primary.asc().nulls_first(),
+                TransactionDB.category_detailed.asc().nulls_first(),
+            )
+        )
+        query = filters.apply(query, category_field)
+
+        result = await db.execute(query)
+
+        root = SpendingRollupNode(name="total", total_amount=0.0, transaction_count=0)
+        months: dict = {}
+        primaries: dict = {}
+        for row in result.all():
+            # The grand total row is returned even when no rows match
+            node = SpendingRollupNode(
+                name="total",
+                total_amount=float(row.total_amount or 0),
+                transaction_count=row.transaction_count,
+            )
+            if row.month_total:
+                root = node
+            elif row.primary_total:
+                node.name = f"{row.month.year}-{row.month.month:02d}"
+                months[row.month] = node
+                root.children.append(node)
+            elif row.detailed_total:
+                node.name = row.primary
+                primaries[(row.month, row.primary)] = node
+                months[row.month].children.append(node)
+            else:
+                node.name = row.detailed
+                primaries[(row.month, row.primary)].children.append(node)
+
+        return root
+    except Exception as e:
+        logger.error(f"Error fetching spending rollup: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/recurring", response_model=list[RecurringPayment])
+async def get_recurring_payments(
+    category_type: str = Query(
+        "detailed", description="Category type: 'primary' or 'detailed'"
+    ),
+    filters: TransactionFilters = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Get subscriptions and recurring bills
+
+    Transactions are grouped by merchant and checked for a regular interval
+    and a stable amount with vectorized pandas operations. Results are cached
+    until the transactions next change.
+
+    Args:
+        category_type: Type of category to report and filter on
+        filters: Date, job, category and amount filters
+        db: Read-only database session
+
+    Returns:
+        List of recurring payments, most recently paid first
+    """
+    try:
+        category_field = (
+            TransactionDB.category_primary
+            if category_type == "primary"
+            else TransactionDB.category_detailed
+        )
+
+        version = await get_data_version(db)
+        cache_key = (category_type, filters.cache_key())
+        cached = recurring_cache.get(cache_key, version)
+        if cached is not None:
+            return cached
+
+        query = select(
+            TransactionDB.merchant_key,
+            TransactionDB.currency,
+            TransactionDB.date,
+            TransactionDB.amount,
+            TransactionDB.title,
+            category_field.label("category"),
+        )
+        query = filters.apply(query, category_field)
+
+        result = await db.execute(query)
+
+        # Keep the event loop free while pandas crunches the full history
+        recurring = await asyncio.to_thread(detect_recurring, result.all())
+
+        payments = [
+            RecurringPayment(
+                merchant=row.merchant_key,
+                title=row.title,
+                category=row.category,
+                currency=row.currency,
+                period=row.period,
+                interval_days=float(row.median_interval),
+                occurrences=int(row.occurrences),
+                average_amount=float(row.average_amount),
+                amount_variation=float(row.amount_variation),
+                is_subscription=bool(row.is_subscription),
+                first_date=row.first_date,
+                last_date=row.last_date,
+                next_expected_date=row.next_expected_date,
+            )
+            for row in recurring.itertuples(index=False)
+        ]
+        recurring_cache.set(cache_key, version, payments)
+        return payments
+    except Exception as e:
+        logger.error(f"Error detecting recurring payments: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
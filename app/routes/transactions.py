@@ -1,41 +1,115 @@
 """Transaction-related API routes"""
 
+import re
+from datetime import date, timedelta
+
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select
+from sqlalchemy import and_, func, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
-from app.api_models import TransactionResponse
-from app.database import get_db
+from app.api_models import (
+    RecategorizeRequest,
+    RecategorizeResponse,
+    SuspectedDuplicate,
+    TransactionResponse,
+)
+from app.cache import TRANSACTIONS, bump_data_version
+from app.database import get_db, get_read_db
 from app.db_models import TransactionDB
+from app.filters import exclude_deleting
 from app.logger import logger
+from app.models import Confidence
+from app.normalize import merchant_key
 
 router = APIRouter(prefix="/transactions", tags=["transactions"])
 
 
+def prefix_tsquery(q: str):
+    """
+    Build a tsquery matching every word of q as a prefix
+
+    Returns None when q has no searchable words. Words are reduced to letters
+    and digits, so user input can never produce tsquery syntax.
+    """
+    words = re.findall(r"\w+", q.lower())
+    if not words:
+        return None
+    return func.to_tsquery("simple", " & ".join(f"{word}:*" for word in words))
+
+
 @router.get("", response_model=list[TransactionResponse])
 async def get_transactions(
     job_id: str | None = Query(None, description="Filter by job ID"),
+    q: str | None = Query(
+        None, min_length=1, max_length=200, description="Search transaction titles"
+    ),
+    category: str | None = Query(None, description="Filter by category"),
+    category_type: str = Query(
+        "detailed", description="Category type: 'primary' or 'detailed'"
+    ),
+    start_date: date | None = Query(None, description="Earliest transaction date"),
+    end_date: date | None = Query(None, description="Latest transaction date"),
     limit: int = Query(100, ge=1, le=1000, description="Maximum number of results"),
     offset: int = Query(0, ge=0, description="Number of results to skip"),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
-    Query transactions with optional filters
+    Query transactions with optional filters and title search
+
+    A search matches titles containing every word of q as a prefix (full-text
+    index) or containing a word similar to q (trigram index, tolerates typos).
+    Search results are ordered by relevance, other results by newest first.
 
     Args:
         job_id: Optional job ID filter
+        q: Optional search text for transaction titles
+        category: Optional category filter
+        category_type: Which category field the category filter applies to
+        start_date: Optional earliest transaction date (inclusive)
+        end_date: Optional latest transaction date (inclusive)
         limit: Maximum number of results
         offset: Number of results to skip
-        db: Database session
+        db: Read-only database session
 
     Returns:
         List of transactions
     """
     try:
-        query = select(TransactionDB).order_by(TransactionDB.created_at.desc())
+        query = exclude_deleting(select(TransactionDB))
 
         if job_id:
             query = query.where(TransactionDB.job_id == job_id)
+        if category:
+            category_field = (
+                TransactionDB.category_primary
+                if category_type == "primary"
+                else TransactionDB.category_detailed
+            )
+            query = query.where(category_field == category)
+        if start_date:
+            query = query.where(TransactionDB.date >= start_date)
+        if end_date:
+            query = query.where(TransactionDB.date < end_date + timedelta(days=1))
+
+        if q:
+            # Each condition is served by its own GIN index (combined with a
+            # BitmapOr), so the search never scans the table
+            similar = TransactionDB.title.op("%>")(q)
+            rank = func.word_similarity(q, TransactionDB.title)
+            tsquery = prefix_tsquery(q)
+            if tsquery is not None:
+                query = query.where(
+                    or_(TransactionDB.title_search.op("@@")(tsquery), similar)
+                )
+                rank = func.greatest(
+                    func.ts_rank(TransactionDB.title_search, tsquery), rank
+                )
+            else:
+                query = query.where(similar)
+            query = query.order_by(rank.desc(), TransactionDB.date.desc())
+        else:
+            query = query.order_by(TransactionDB.created_at.desc())
 
         query = query.limit(limit).offset(offset)
 
@@ -46,3 +120,150 @@ async def get_transactions(
     except Exception as e:
         logger.error(f"Error fetching transactions: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/duplicates", response_model=list[SuspectedDuplicate])
+async def get_suspected_duplicates(
+    window_days: int = Query(
+        3, ge=0, le=31, description="Maximum days between the two transactions"
+    ),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of results"),
+    offset: int = Query(0, ge=0, description="Number of results to skip"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    List suspected duplicates that differ too much to be caught by fingerprint
+
+    Exact duplicates are never inserted. This finds pairs from different
+    statements with the same merchant, amount and currency dated within
+    window_days of each other, e.g. a purchase posted a day later on the
+    second statement. The pairs are found with one indexed self-join.
+
+    Args:
+        window_days: Maximum days between the two transactions
+        limit: Maximum number of results
+        offset: Number of results to skip
+        db: Read-only database session
+
+    Returns:
+        List of suspected duplicates with the earlier transaction they duplicate
+    """
+    try:
+        original = aliased(TransactionDB)
+        copy = aliased(TransactionDB)
+        window = timedelta(days=window_days)
+
+        query = (
+            select(copy, original)
+            .join(
+                original,
+                and_(
+                    original.merchant_key == copy.merchant_key,
+                    original.amount == copy.amount,
+                    original.currency == copy.currency,
+                    original.job_id != copy.job_id,
+                    original.id < copy.id,
+                    original.date.between(copy.date - window, copy.date + window),
+                ),
+            )
+            .where(copy.merchant_key.is_not(None), copy.merchant_key != "")
+            .order_by(copy.date.desc(), copy.id.desc())
+            .limit(limit)
+            .offset(offset)
+        )
+        query = exclude_deleting(exclude_deleting(query, copy), original)
+
+        result = await db.execute(query)
+        return [
+            SuspectedDuplicate(
+                transaction=TransactionResponse.model_validate(row[0]),
+                duplicate_of=TransactionResponse.model_validate(row[1]),
+            )
+            for row in result.all()
+        ]
+    except Exception as e:
+        logger.error(f"Error fetching suspected duplicates: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/recategorize", response_model=RecategorizeResponse)
+async def recategorize_transactions(
+    request: RecategorizeRequest, db: AsyncSession = Depends(get_db)
+):
+    """
+    Set the categories of every transaction from a merchant in one statement
+
+    Matched rows are updated by a single UPDATE, and cached analyses and the
+    worker's category classifier are invalidated in the same transaction.
+    Recategorized rows are marked VERY_HIGH confidence, as the user chose them.
+
+    Args:
+        request: The merchant to match and its new categories
+        db: Database session
+
+    Returns:
+        Number of updated transactions, by their previous detailed category
+    """
+    try:
+        if request.merchant_key is not None:
+            key = merchant_key(request.merchant_key)
+            if not key:
+                raise HTTPException(
+                    status_code=400, detail="merchant_key has no merchant words"
+                )
+            condition = TransactionDB.merchant_key == key
+        else:
+            pattern = re.sub(r"([\\%_])", r"\\\1", request.title_pattern)
+            condition = TransactionDB.title.ilike(f"%{pattern}%", escape="\\")
+
+        primary = request.category_primary.value
+        detailed = request.category_detailed.value
+
+        # Lock the matched rows and remember their old category, so the update
+        # and the report are one statement. Rows of jobs being deleted are
+        # left to the purge.
+        previous = (
+            exclude_deleting(
+                select(
+                    TransactionDB.id,
+                    TransactionDB.category_detailed.label("category_detailed"),
+                ).where(
+                    condition,
+                    or_(
+                        TransactionDB.category_primary != primary,
+                        TransactionDB.category_detailed != detailed,
+                    ),
+                )
+            )
+            .with_for_update()
+            .cte("previous")
+        )
+        result = await db.execute(
+            update(TransactionDB)
+            .where(TransactionDB.id == previous.c.id)
+            .values(
+                category_primary=primary,
+                category_detailed=detailed,
+                category_confidence_level=Confidence.VERY_HIGH.value,
+            )
+            .returning(previous.c.category_detailed)
+        )
+        previous_categories = {}
+        for (category,) in result.all():
+            previous_categories[category] = previous_categories.get(category, 0) + 1
+        updated = sum(previous_categories.values())
+
+        if updated:
+            await bump_data_version(db, TRANSACTIONS)
+        await db.commit()
+
+        logger.info(f"Recategorized {updated} transactions to {primary}/{detailed}")
+        return RecategorizeResponse(
+            updated=updated, previous_categories=previous_categories
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error recategorizing transactions: {e}", exc_info=True)
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
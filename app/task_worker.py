@@ -0,0 +1,339 @@
+"""Worker that processes extraction tasks delivered by a task queue"""
+
+import asyncio
+import base64
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, delete, func, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import bump_data_version
+from app.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from app.classifier import CategoryClassifier
+from app.database import AsyncSessionLocal
+from app.db_models import Job, JobStatus, TransactionDB
+from app.lanes import INTERACTIVE
+from app.logger import logger
+from app.normalize import fingerprints, merchant_key
+from app.partitions import ensure_partitions
+from app.pdf_optimizer import optimize_pdf
+from app.queues import TaskQueue
+from app.settings import get_settings
+from app.worker import ExtractionUsage, GeminiWorker, is_provider_error
+
+# Rows per INSERT statement, well under asyncpg's 32767 bind parameter limit
+INSERT_CHUNK_SIZE = 1000
+
+
+def transaction_rows(job_id: str, transactions: list) -> list[dict]:
+    """TransactionDB rows for a job's extracted transactions, with fingerprints"""
+    return [
+        {
+            "job_id": job_id,
+            "date": trans.date,
+            "title": trans.title,
+            "amount": trans.amount,
+            "currency": trans.currency,
+            "category_primary": trans.category_primary,
+            "category_detailed": trans.category_detailed,
+            "category_confidence_level": trans.category_confidence_level,
+            "fingerprint": fp,
+            "merchant_key": merchant_key(trans.title),
+        }
+        for trans, fp in zip(
+            transactions,
+            fingerprints((t.date, t.amount, t.currency, t.title) for t in transactions),
+        )
+    ]
+
+
+async def insert_transactions(session: AsyncSession, rows: list[dict]) -> int:
+    """
+    Insert rows with multi-row INSERTs, skipping fingerprints already saved
+
+    Rows of DELETING jobs are hidden but may not be purged yet. Those with the
+    same fingerprints are deleted first, so re-uploading a deleted statement
+    saves its rows instead of skipping them as duplicates.
+
+    Returns:
+        Number of rows inserted
+    """
+    inserted = 0
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        chunk = rows[start : start + INSERT_CHUNK_SIZE]
+        await session.execute(
+            delete(TransactionDB).where(
+                tuple_(TransactionDB.fingerprint, TransactionDB.date).in_(
+                    [(row["fingerprint"], row["date"]) for row in chunk]
+                ),
+                TransactionDB.job_id.in_(
+                    select(Job.id).where(Job.status == JobStatus.DELETING)
+                ),
+            )
+        )
+        result = await session.execute(
+            insert(TransactionDB)
+            .values(chunk)
+            .on_conflict_do_nothing(
+                index_elements=[TransactionDB.fingerprint, TransactionDB.date]
+            )
+            .returning(TransactionDB.id)
+        )
+        inserted += len(result.all())
+    return inserted
+
+
+class GeminiTaskWorker:
+    """Worker that consumes tasks from a task queue and processes them with Gemini"""
+
+    def __init__(self, queue: TaskQueue):
+        self.settings = get_settings()
+        self.queue = queue
+        # Pauses the queue during Gemini outages, see on_circuit_change
+        self.breaker = CircuitBreaker("gemini", is_failure=is_provider_error)
+        self.breaker.add_listener(self.on_circuit_change)
+        self.gemini_worker = GeminiWorker(breaker=self.breaker)
+        self.classifier = (
+            CategoryClassifier() if self.settings.CLASSIFIER_ENABLED else None
+        )
+
+    async def start(self):
+        """Consume tasks from the queue until stopped"""
+        try:
+            await self.queue.run(self.process_task)
+        finally:
+            self.breaker.cancel()
+
+    async def on_circuit_change(self, state: str):
+        """Stop consuming while the circuit is open and let trial tasks probe it"""
+        if state == OPEN:
+            await self.queue.pause()
+        elif state == HALF_OPEN:
+            await self.queue.probe(self.settings.CIRCUIT_HALF_OPEN_CALLS)
+        elif state == CLOSED:
+            await self.queue.resume()
+
+    async def process_task(self, task: dict):
+        """
+        Process a task using Gemini and update database
+
+        Raises on extraction or database errors so the caller can retry the task.
+
+        Expected task format:
+        {
+            "task_id": "unique_id",
+            "task_type": "extract_transactions",
+            "filename": "statement.pdf",
+            "lane": "interactive",
+            "pdf_content": "base64_encoded_pdf"
+        }
+        """
+        task_id = task.get("task_id", "unknown")
+        task_type = task.get("task_type")
+        filename = task.get("filename", "unknown.pdf")
+
+        if task_type != "extract_transactions":
+            logger.error(f"Task {task_id} has unsupported task_type: {task_type}")
+            return
+
+        pdf_content_b64 = task.get("pdf_content")
+        if not pdf_content_b64:
+            logger.error(f"Task {task_id} missing pdf_content")
+            return
+
+        # Take the job's lease; fails if it is finished or another worker holds
+        # it. Returning leaves the job alone: its stored PDF is only dropped once
+        # the job is completed, so the lease holder (or the reaper) still has it
+        if not await self.acquire_lease(task_id):
+            logger.info(f"Skipping task {task_id}: job is finished or leased elsewhere")
+            return
+        logger.info(f"Processing transaction extraction task {task_id} for {filename}")
+
+        usage = ExtractionUsage()
+        heartbeat = asyncio.create_task(self.heartbeat(task_id))
+        try:
+            # Decode base64 PDF
+            pdf_bytes = base64.b64decode(pdf_content_b64)
+
+            # Strip what the model doesn't need, off the event loop
+            optimized = await asyncio.to_thread(optimize_pdf, pdf_bytes)
+            if optimized.bytes_saved:
+                logger.info(
+                    f"Task {task_id}: optimized PDF from {len(pdf_bytes)} to "
+                    f"{len(optimized.pdf_bytes)} bytes, dropped "
+                    f"{optimized.pages_dropped} page(s), downsampled "
+                    f"{optimized.images_downsampled} image(s)"
+                )
+
+            # Extract transactions directly from PDF using Gemini's native support
+            extraction_started = time.monotonic()
+            transactions = await self.gemini_worker.extract_transactions_from_pdf(
+                optimized.pdf_bytes,
+                lane=task.get("lane", INTERACTIVE),
+                usage=usage,
+            )
+            extraction_ms = int((time.monotonic() - extraction_started) * 1000)
+        except Exception:
+            # Tokens spent on a failed attempt still count towards the job's cost
+            await self.record_tokens(task_id, usage)
+            raise
+        finally:
+            heartbeat.cancel()
+
+        # Prefer categories learned from saved transactions (including user
+        # corrections) wherever a title closely matches a known one
+        if self.classifier:
+            try:
+                matched = await self.classifier.categorize(transactions.transactions)
+                logger.info(
+                    f"Task {task_id}: classifier categorized {matched} of "
+                    f"{len(transactions.transactions)} transactions"
+                )
+            except Exception as e:
+                logger.error(
+                    f"Category classifier failed for task {task_id}, keeping LLM categories: {e}",
+                    exc_info=True,
+                )
+
+        # Make sure the monthly partitions for these transactions exist
+        await ensure_partitions(t.date for t in transactions.transactions)
+
+        # Save transactions to database
+        async with AsyncSessionLocal() as session:
+            transaction_count = len(transactions.transactions)
+
+            # Complete the job only while still holding its lease; the row lock
+            # taken here also serializes any concurrent attempt at the same job
+            result = await session.execute(
+                update(Job)
+                .where(
+                    Job.id == task_id,
+                    Job.status == JobStatus.PROCESSING,
+                    Job.worker_id == self.queue.worker_id,
+                )
+                .values(
+                    status=JobStatus.COMPLETED,
+                    completed_at=datetime.now(timezone.utc),
+                    transaction_count=transaction_count,
+                    error_message=None,
+                    worker_id=None,
+                    lease_expires_at=None,
+                    bytes_processed=len(pdf_bytes),
+                    bytes_saved=optimized.bytes_saved,
+                    extraction_ms=extraction_ms,
+                    input_tokens=func.coalesce(Job.input_tokens, 0)
+                    + usage.input_tokens,
+                    output_tokens=func.coalesce(Job.output_tokens, 0)
+                    + usage.output_tokens,
+                    model=usage.model,
+                )
+            )
+            if result.rowcount == 0:
+                await session.rollback()
+                logger.warning(
+                    f"Discarding results for task {task_id}: lease was lost to another worker"
+                )
+                return
+
+            # Replace rows from any earlier partial attempt so reprocessing is idempotent
+            await session.execute(
+                delete(TransactionDB).where(TransactionDB.job_id == task_id)
+            )
+
+            # Insert all transactions, skipping any already saved from an
+            # overlapping statement
+            rows = transaction_rows(task_id, transactions.transactions)
+            duplicate_count = len(rows) - await insert_transactions(session, rows)
+
+            # Invalidate cached analyses in the same transaction as the write
+            await bump_data_version(session)
+
+            await session.commit()
+
+            logger.info(
+                f"Task {task_id} completed: extracted {transaction_count} transactions from {filename}, "
+                f"skipped {duplicate_count} already saved from other statements"
+            )
+
+    async def record_tokens(self, task_id: str, usage: ExtractionUsage):
+        """Add the tokens of a failed attempt to the job, best effort"""
+        if not usage.input_tokens and not usage.output_tokens:
+            return
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(
+                    update(Job)
+                    .where(Job.id == task_id)
+                    .values(
+                        input_tokens=func.coalesce(Job.input_tokens, 0)
+                        + usage.input_tokens,
+                        output_tokens=func.coalesce(Job.output_tokens, 0)
+                        + usage.output_tokens,
+                    )
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Could not record token usage of job {task_id}: {e}")
+
+    async def acquire_lease(self, task_id: str) -> bool:
+        """
+        Mark a job PROCESSING under this worker's lease
+
+        The job must be PENDING, already leased to this worker (claimed by the
+        Postgres queue), or PROCESSING under a lease that has expired.
+        """
+        now = datetime.now(timezone.utc)
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(Job)
+                .where(
+                    Job.id == task_id,
+                    or_(
+                        Job.status == JobStatus.PENDING,
+                        and_(
+                            Job.status == JobStatus.PROCESSING,
+                            or_(
+                                Job.worker_id == self.queue.worker_id,
+                                Job.lease_expires_at < now,
+                            ),
+                        ),
+                    ),
+                )
+                .values(
+                    status=JobStatus.PROCESSING,
+                    started_at=now,
+                    worker_id=self.queue.worker_id,
+                    heartbeat_at=now,
+                    lease_expires_at=now
+                    + timedelta(seconds=self.settings.JOB_LEASE_SECONDS),
+                )
+            )
+            await session.commit()
+        return result.rowcount == 1
+
+    async def heartbeat(self, task_id: str):
+        """Extend this worker's lease on a job until cancelled"""
+        while True:
+            await asyncio.sleep(self.settings.JOB_HEARTBEAT_INTERVAL_SECONDS)
+            now = datetime.now(timezone.utc)
+            try:
+                async with AsyncSessionLocal() as session:
+                    result = await session.execute(
+                        update(Job)
+                        .where(Job.id == task_id, Job.worker_id == self.queue.worker_id)
+                        .values(
+                            heartbeat_at=now,
+                            lease_expires_at=now
+                            + timedelta(seconds=self.settings.JOB_LEASE_SECONDS),
+                        )
+                    )
+                    await session.commit()
+            except Exception as e:
+                logger.error(f"Heartbeat for job {task_id} failed: {e}")
+                continue
+
+            if result.rowcount == 0:
+                logger.warning(f"Lost lease on job {task_id}")
+                return
@@ -1,10 +1,27 @@
+import asyncio
 import base64
+import json
+import threading
+import time
+from dataclasses import dataclass
 
+from google.api_core import exceptions as google_exceptions
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import Runnable
 from langchain_google_genai import ChatGoogleGenerativeAI
 
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.hedging import DeadlineExceededError, LatencyTracker, hedged_call
+from app.lanes import BULK, INTERACTIVE
+from app.logger import logger
+from app.model_router import (
+    escalation_reason,
+    route,
+    tier_latency_histogram,
+    tier_results_counter,
+)
 from app.models import TransactionList
+from app.prompt_cache import PromptCache, create_cache_backend, input_tokens_counter
 from app.settings import get_settings
 
 settings = get_settings()
@@ -83,85 +100,308 @@ EXTRACTION REQUIREMENTS:
 - Amounts should be positive for expenses, negative for income"""
 
 
+@dataclass
+class ExtractionUsage:
+    """Tokens spent on an extraction and the model whose answer was used"""
+
+    model: str | None = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+    def add(self, model: str, response: dict) -> TransactionList | None:
+        """
+        Count the tokens of a structured output response (include_raw=True)
+
+        Returns:
+            The parsed TransactionList, or None if the answer didn't validate
+        """
+        usage = getattr(response["raw"], "usage_metadata", None) or {}
+        input_tokens = usage.get("input_tokens", 0)
+        cached_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0)
+        self.input_tokens += input_tokens
+        self.output_tokens += usage.get("output_tokens", 0)
+        input_tokens_counter.inc(cached_tokens, model=model, source="cache")
+        input_tokens_counter.inc(
+            input_tokens - cached_tokens, model=model, source="prompt"
+        )
+        if response.get("parsing_error") or response.get("parsed") is None:
+            return None
+        self.model = model
+        return response["parsed"]
+
+
+class InvalidExtractionError(Exception):
+    """The model's answer could not be parsed into a TransactionList"""
+
+
+def is_provider_error(error: Exception) -> bool:
+    """
+    Whether a Gemini request failed because of the provider or the network
+
+    Timeouts, rate limits and server errors count; errors about the request
+    itself, such as a document Gemini rejects, don't.
+    """
+    if isinstance(error, (DeadlineExceededError, TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, google_exceptions.RetryError):
+        return True
+    if isinstance(error, google_exceptions.GoogleAPICallError):
+        return error.code is not None and (
+            error.code in (408, 429) or error.code >= 500
+        )
+    return False
+
+
+# Static parts of every extraction request, built once. The output schema is
+# also enforced through the generation config, but spelling it out in the
+# system prompt puts it in the prompt cache along with the instructions.
+SYSTEM_PROMPT = (
+    TRANSACTION_EXTRACTION_PROMPT
+    + "\n\nOUTPUT SCHEMA:\nReturn a single JSON object matching this JSON schema:\n"
+    + json.dumps(TransactionList.model_json_schema(), indent=2)
+)
+SYSTEM_MESSAGE = SystemMessage(content=SYSTEM_PROMPT)
+INSTRUCTION = {
+    "type": "text",
+    "text": "Extract all transactions from this PDF document. Pay close attention to tables, columns, and formatting.",
+}
+
+
+def build_messages(pdf_bytes: bytes, cached_prompt: bool) -> list:
+    """
+    Extraction request with the PDF attached as inline data
+
+    The system prompt is left out when the model reads it from a prompt cache.
+    """
+    # Encode PDF as base64 for Gemini
+    pdf_base64 = base64.b64encode(pdf_bytes).decode("utf-8")
+    document = HumanMessage(
+        content=[
+            INSTRUCTION,
+            {"type": "media", "mime_type": "application/pdf", "data": pdf_base64},
+        ]
+    )
+    return [document] if cached_prompt else [SYSTEM_MESSAGE, document]
+
+
 class GeminiWorker:
-    """Worker class for Gemini Flash 2.5 with LangChain"""
+    """
+    Worker class for Gemini with LangChain
+
+    Each document is routed to the cheapest model tier suited to it (see
+    app.model_router) and escalated to stronger tiers while the answer is
+    invalid or mostly low-confidence. Every request goes through the circuit
+    breaker, if one is given, so it only sees provider errors and the latency
+    of single requests.
+    """
+
+    def __init__(self, breaker: CircuitBreaker | None = None):
+        self.breaker = breaker
+        self.prompt_cache = PromptCache(SYSTEM_PROMPT, create_cache_backend())
+        # Structured output chains by (model, provider cache name), built on
+        # first use and rebuilt only when a model's prompt cache is replaced
+        self.chains: dict[tuple[str, str | None], Runnable] = {}
+        self.chains_lock = threading.Lock()
+        # Recent latencies per model and lane; small and bulk documents differ
+        # too much to share
+        self.latencies: dict[tuple[str, str], LatencyTracker] = {}
+
+    def chain(self, model: str) -> tuple[Runnable, bool]:
+        """
+        Structured output chain for model, reading the prompt from its cache
+        when one is available
 
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            google_api_key=settings.GOOGLE_API_KEY,
-            temperature=0.1,  # Lower temperature for more consistent structured output
+        Blocks while a prompt cache is created or refreshed.
+
+        Returns:
+            (chain, whether the system prompt is cached)
+        """
+        cache_name = self.prompt_cache.get(model)
+        if not self.prompt_cache.remote:
+            # The local stand-in only simulates the cache
+            cache_name = None
+
+        key = (model, cache_name)
+        with self.chains_lock:
+            if key not in self.chains:
+                # Drop the chain for the model's replaced cache, if any
+                for stale in [k for k in self.chains if k[0] == model]:
+                    del self.chains[stale]
+                llm = ChatGoogleGenerativeAI(
+                    model=model,
+                    google_api_key=settings.GOOGLE_API_KEY,
+                    temperature=0.1,  # Lower temperature for more consistent structured output
+                    cached_content=cache_name,
+                )
+                # The schema goes in the generation config: Gemini rejects tools
+                # (function calling) alongside cached content
+                self.chains[key] = llm.with_structured_output(
+                    TransactionList, method="json_schema", include_raw=True
+                )
+            return self.chains[key], cache_name is not None
+
+    def deadline(self, lane: str) -> float:
+        """Latency budget (seconds) for extracting a document in lane"""
+        if lane == BULK:
+            return settings.LLM_DEADLINE_BULK_SECONDS
+        return settings.LLM_DEADLINE_INTERACTIVE_SECONDS
+
+    def slow_call_seconds(self, lane: str) -> float:
+        """Duration (seconds) from which a request in lane counts as slow"""
+        if lane == BULK:
+            return settings.CIRCUIT_SLOW_CALL_BULK_SECONDS
+        return settings.CIRCUIT_SLOW_CALL_INTERACTIVE_SECONDS
+
+    async def call_provider(self, lane: str, function, *args, **kwargs):
+        """Send a request through the circuit breaker, if any"""
+        if self.breaker is None:
+            return await function(*args, **kwargs)
+        return await self.breaker.call(
+            function, *args, slow_call_seconds=self.slow_call_seconds(lane), **kwargs
         )
-        self.parser = StrOutputParser()
-        self.chain = self.llm | self.parser
 
-    async def extract_transactions_from_pdf(self, pdf_bytes: bytes) -> TransactionList:
+    def hedge_delay(self, tracker: LatencyTracker) -> float | None:
+        """
+        Seconds to wait before sending a hedged request, or None to not hedge
+
+        The delay is the LLM_HEDGE_PERCENTILE of the tracker's recent latencies,
+        so only the slowest requests get hedged.
+        """
+        if (
+            not settings.LLM_HEDGE_ENABLED
+            or len(tracker.latencies) < settings.LLM_HEDGE_MIN_SAMPLES
+        ):
+            return None
+        return max(
+            tracker.percentile(settings.LLM_HEDGE_PERCENTILE),
+            settings.LLM_HEDGE_MIN_DELAY_SECONDS,
+        )
+
+    def review(
+        self, model: str, result: TransactionList | None, started: float, last: bool
+    ) -> bool:
+        """
+        Record a tier's attempt and decide whether to accept its result
+
+        Raises:
+            InvalidExtractionError: The result is invalid and there's no
+                stronger tier left
+        """
+        tier_latency_histogram.observe(time.monotonic() - started, model=model)
+        if result is None:
+            tier_results_counter.inc(model=model, result="invalid")
+            if last:
+                raise InvalidExtractionError(f"{model} returned no valid transactions")
+            logger.info(f"Escalating extraction from {model}: invalid response")
+            return False
+
+        reason = escalation_reason(result)
+        if reason is None or last:
+            tier_results_counter.inc(model=model, result="accepted")
+            return True
+        tier_results_counter.inc(model=model, result="escalated")
+        logger.info(f"Escalating extraction from {model}: {reason}")
+        return False
+
+    async def extract_transactions_from_pdf(
+        self,
+        pdf_bytes: bytes,
+        lane: str = INTERACTIVE,
+        usage: ExtractionUsage | None = None,
+    ) -> TransactionList:
         """
         Extract transactions directly from PDF bytes using Gemini's native PDF support
 
+        Every tier tried shares the lane's deadline, and each request is hedged
+        with a second one when it runs slower than usual for its model.
+
         Args:
             pdf_bytes: PDF file content as bytes
+            lane: Lane of the document, which sets its deadline
+            usage: Accumulates the tokens of every response received (a hedged
+                request that loses is cancelled before its usage is known)
 
         Returns:
             TransactionList with extracted transactions
+
+        Raises:
+            CircuitOpenError: The circuit breaker rejected a request
+            DeadlineExceededError: No response within the lane's deadline
+            InvalidExtractionError: No tier returned a valid response
         """
-        # Use structured output with Pydantic model
-        structured_llm = self.llm.with_structured_output(TransactionList)
-
-        # Encode PDF as base64 for Gemini
-        pdf_base64 = base64.b64encode(pdf_bytes).decode("utf-8")
-
-        # Create message with PDF inline data
-        messages = [
-            SystemMessage(content=TRANSACTION_EXTRACTION_PROMPT),
-            HumanMessage(
-                content=[
-                    {
-                        "type": "text",
-                        "text": "Extract all transactions from this PDF document. Pay close attention to tables, columns, and formatting.",
-                    },
-                    {
-                        "type": "media",
-                        "mime_type": "application/pdf",
-                        "data": pdf_base64,
-                    },
-                ]
-            ),
-        ]
+        models = route(pdf_bytes)
+        deadline = time.monotonic() + self.deadline(lane)
+        usage = usage if usage is not None else ExtractionUsage()
+        fallback = None
+
+        for i, model in enumerate(models):
+            structured_llm, cached = await asyncio.to_thread(self.chain, model)
+            messages = build_messages(pdf_bytes, cached)
+            tracker = self.latencies.setdefault((model, lane), LatencyTracker())
+            started = time.monotonic()
+            try:
+                response = await self.call_provider(
+                    lane,
+                    hedged_call,
+                    lambda: structured_llm.ainvoke(messages),
+                    deadline=deadline - started,
+                    hedge_after=self.hedge_delay(tracker),
+                    tracker=tracker,
+                )
+            except CircuitOpenError:
+                # The queue re-queues the task without using up an attempt
+                raise
+            except Exception:
+                tier_results_counter.inc(model=model, result="error")
+                if fallback is None:
+                    raise
+                # A weaker tier's low-confidence answer beats none at all
+                return fallback
+
+            result = usage.add(model, response)
+            if self.review(model, result, started, last=i == len(models) - 1):
+                return result
+            if result is not None:
+                fallback = result
+            if deadline - time.monotonic() <= 0 and fallback is not None:
+                return fallback
 
-        result = await structured_llm.ainvoke(messages)
-        return result
+        return fallback
 
-    def extract_transactions_from_pdf_sync(self, pdf_bytes: bytes) -> TransactionList:
+    def extract_transactions_from_pdf_sync(
+        self, pdf_bytes: bytes, usage: ExtractionUsage | None = None
+    ) -> TransactionList:
         """
-        Synchronous version of extract_transactions_from_pdf
+        Synchronous version of extract_transactions_from_pdf, without deadlines
+        or hedging
 
         Args:
             pdf_bytes: PDF file content as bytes
+            usage: Accumulates the tokens of every response received
 
         Returns:
             TransactionList with extracted transactions
         """
-        structured_llm = self.llm.with_structured_output(TransactionList)
-
-        pdf_base64 = base64.b64encode(pdf_bytes).decode("utf-8")
-
-        messages = [
-            SystemMessage(content=TRANSACTION_EXTRACTION_PROMPT),
-            HumanMessage(
-                content=[
-                    {
-                        "type": "text",
-                        "text": "Extract all transactions from this PDF document. Pay close attention to tables, columns, and formatting.",
-                    },
-                    {
-                        "type": "media",
-                        "mime_type": "application/pdf",
-                        "data": pdf_base64,
-                    },
-                ]
-            ),
-        ]
+        models = route(pdf_bytes)
+        usage = usage if usage is not None else ExtractionUsage()
+        fallback = None
+
+        for i, model in enumerate(models):
+            structured_llm, cached = self.chain(model)
+            messages = build_messages(pdf_bytes, cached)
+            started = time.monotonic()
+            try:
+                response = structured_llm.invoke(messages)
+            except Exception:
+                tier_results_counter.inc(model=model, result="error")
+                if fallback is None:
+                    raise
+                return fallback
+
+            result = usage.add(model, response)
+            if self.review(model, result, started, last=i == len(models) - 1):
+                return result
+            if result is not None:
+                fallback = result
 
-        result = structured_llm.invoke(messages)
-        return result
+        return fallback
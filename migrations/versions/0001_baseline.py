@@ -0,0 +1,65 @@
+"""Baseline jobs and transactions tables
+
+Databases created by the old create_all() startup already have these tables,
+so they are only created when missing.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("jobs"):
+        op.create_table(
+            "jobs",
+            sa.Column("id", sa.String(36), primary_key=True),
+            sa.Column("filename", sa.String(255), nullable=False),
+            sa.Column("status", sa.String(10), nullable=False),
+            sa.Column(
+                "created_at",
+                sa.DateTime(timezone=True),
+                server_default=sa.func.now(),
+                nullable=False,
+            ),
+            sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("error_message", sa.Text(), nullable=True),
+            sa.Column("transaction_count", sa.Integer(), nullable=True),
+        )
+
+    if not inspector.has_table("transactions"):
+        op.create_table(
+            "transactions",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("job_id", sa.String(36), nullable=False),
+            sa.Column("date", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("title", sa.String(500), nullable=False),
+            sa.Column("amount", sa.Float(), nullable=False),
+            sa.Column("currency", sa.String(10), nullable=False),
+            sa.Column("category_primary", sa.String(50), nullable=False),
+            sa.Column("category_detailed", sa.String(100), nullable=False),
+            sa.Column("category_confidence_level", sa.String(20), nullable=False),
+            sa.Column(
+                "created_at",
+                sa.DateTime(timezone=True),
+                server_default=sa.func.now(),
+                nullable=False,
+            ),
+        )
+        op.create_index("ix_transactions_job_id", "transactions", ["job_id"])
+
+
+def downgrade():
+    op.drop_table("transactions")
+    op.drop_table("jobs")
@@ -0,0 +1,78 @@
+"""Queue bookkeeping, worker leases, batch uploads and stored payloads
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("jobs", sa.Column("batch_id", sa.String(36), nullable=True))
+    op.add_column(
+        "jobs",
+        sa.Column("lane", sa.String(20), nullable=False, server_default="interactive"),
+    )
+    op.add_column(
+        "jobs", sa.Column("attempts", sa.Integer(), nullable=False, server_default="0")
+    )
+    op.add_column(
+        "jobs", sa.Column("available_at", sa.DateTime(timezone=True), nullable=True)
+    )
+    op.add_column("jobs", sa.Column("worker_id", sa.String(100), nullable=True))
+    op.add_column(
+        "jobs", sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True)
+    )
+    op.add_column(
+        "jobs",
+        sa.Column("lease_expires_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+    op.create_index("ix_jobs_batch_id", "jobs", ["batch_id"])
+    op.create_index(
+        "ix_jobs_lease_expires_at",
+        "jobs",
+        ["lease_expires_at"],
+        postgresql_where=sa.text("status = 'PROCESSING'"),
+    )
+    op.create_index(
+        "ix_jobs_claimable",
+        "jobs",
+        ["lane", "available_at"],
+        postgresql_where=sa.text("status IN ('PENDING', 'PROCESSING')"),
+    )
+
+    op.create_table(
+        "job_payloads",
+        sa.Column(
+            "job_id",
+            sa.String(36),
+            sa.ForeignKey("jobs.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("pdf_content", sa.LargeBinary(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("job_payloads")
+    op.drop_index("ix_jobs_claimable", table_name="jobs")
+    op.drop_index("ix_jobs_lease_expires_at", table_name="jobs")
+    op.drop_index("ix_jobs_batch_id", table_name="jobs")
+    for column in (
+        "lease_expires_at",
+        "heartbeat_at",
+        "worker_id",
+        "available_at",
+        "attempts",
+        "lane",
+        "batch_id",
+    ):
+        op.drop_column("jobs", column)
@@ -0,0 +1,29 @@
+"""Record the uploading client on jobs for per-client admission quotas
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("jobs", sa.Column("client_id", sa.String(100), nullable=True))
+    op.create_index(
+        "ix_jobs_client_in_flight",
+        "jobs",
+        ["client_id"],
+        postgresql_where=sa.text("status IN ('PENDING', 'PROCESSING')"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_jobs_client_in_flight", table_name="jobs")
+    op.drop_column("jobs", "client_id")
@@ -0,0 +1,46 @@
+"""Full-text and trigram indexes for searching transaction titles
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column(
+        "transactions",
+        sa.Column(
+            "title_search",
+            TSVECTOR(),
+            sa.Computed("to_tsvector('simple', title)", persisted=True),
+        ),
+    )
+    op.create_index(
+        "ix_transactions_title_search",
+        "transactions",
+        ["title_search"],
+        postgresql_using="gin",
+    )
+    op.create_index(
+        "ix_transactions_title_trgm",
+        "transactions",
+        ["title"],
+        postgresql_using="gin",
+        postgresql_ops={"title": "gin_trgm_ops"},
+    )
+
+
+def downgrade():
+    op.drop_index("ix_transactions_title_trgm", table_name="transactions")
+    op.drop_index("ix_transactions_title_search", table_name="transactions")
+    op.drop_column("transactions", "title_search")
@@ -0,0 +1,81 @@
+"""Transaction fingerprints and merchant keys for duplicate detection
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+
+Existing rows are backfilled with the app's normalization. Where existing rows
+already duplicate each other, the first keeps the fingerprint and the rest are
+left NULL so the unique index can be built; they still show up as suspected
+duplicates.
+"""
+
+from collections import defaultdict
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.normalize import fingerprints, merchant_key
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def backfill():
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.text(
+            "SELECT id, job_id, date, amount, currency, title "
+            "FROM transactions ORDER BY job_id, id"
+        )
+    ).all()
+
+    by_job = defaultdict(list)
+    for row in rows:
+        by_job[row.job_id].append(row)
+
+    seen = set()
+    updates = []
+    for job_rows in by_job.values():
+        job_fingerprints = fingerprints(
+            (row.date, row.amount, row.currency, row.title) for row in job_rows
+        )
+        for row, fp in zip(job_rows, job_fingerprints):
+            if fp in seen:
+                fp = None
+            else:
+                seen.add(fp)
+            updates.append({"id": row.id, "fp": fp, "mk": merchant_key(row.title)})
+
+    statement = sa.text(
+        "UPDATE transactions SET fingerprint = :fp, merchant_key = :mk WHERE id = :id"
+    )
+    for start in range(0, len(updates), BATCH_SIZE):
+        conn.execute(statement, updates[start : start + BATCH_SIZE])
+
+
+def upgrade():
+    op.add_column("transactions", sa.Column("fingerprint", sa.String(64)))
+    op.add_column("transactions", sa.Column("merchant_key", sa.String(100)))
+    backfill()
+    op.create_index(
+        "ux_transactions_fingerprint",
+        "transactions",
+        ["fingerprint"],
+        unique=True,
+        postgresql_where=sa.text("fingerprint IS NOT NULL"),
+    )
+    op.create_index(
+        "ix_transactions_merchant_amount", "transactions", ["merchant_key", "amount"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_transactions_merchant_amount", table_name="transactions")
+    op.drop_index("ux_transactions_fingerprint", table_name="transactions")
+    op.drop_column("transactions", "merchant_key")
+    op.drop_column("transactions", "fingerprint")
@@ -0,0 +1,33 @@
+"""Date and category indexes for filtered spending queries
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_transactions_date", "transactions", ["date"])
+    op.create_index(
+        "ix_transactions_category_primary_date",
+        "transactions",
+        ["category_primary", "date"],
+    )
+    op.create_index(
+        "ix_transactions_category_detailed_date",
+        "transactions",
+        ["category_detailed", "date"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_transactions_category_detailed_date", table_name="transactions")
+    op.drop_index("ix_transactions_category_primary_date", table_name="transactions")
+    op.drop_index("ix_transactions_date", table_name="transactions")
@@ -0,0 +1,38 @@
+"""Foreign key from transactions to jobs with ON DELETE CASCADE
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+
+Transactions whose job no longer exists are removed first. The constraint is
+added NOT VALID and validated separately, so existing rows are checked without
+blocking writes to the table.
+"""
+
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "DELETE FROM transactions t "
+        "WHERE NOT EXISTS (SELECT 1 FROM jobs j WHERE j.id = t.job_id)"
+    )
+    op.create_foreign_key(
+        "transactions_job_id_fkey",
+        "transactions",
+        "jobs",
+        ["job_id"],
+        ["id"],
+        ondelete="CASCADE",
+        postgresql_not_valid=True,
+    )
+    op.execute("ALTER TABLE transactions VALIDATE CONSTRAINT transactions_job_id_fkey")
+
+
+def downgrade():
+    op.drop_constraint("transactions_job_id_fkey", "transactions", type_="foreignkey")
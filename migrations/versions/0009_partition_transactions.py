@@ -0,0 +1,160 @@
+"""Partition transactions by month on date
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+
+The table is rebuilt as a range-partitioned table: the old table is renamed,
+a partition is created for every month that has rows, the rows are copied
+and the old table is dropped. Further partitions are created on demand by
+app.partitions. The copy rewrites the whole table, so run it in a
+maintenance window on large databases.
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.partitions import create_partition_sql, month_start, next_month
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    "id, job_id, date, title, amount, currency, category_primary, "
+    "category_detailed, category_confidence_level, created_at, fingerprint, "
+    "merchant_key"
+)
+
+INDEXES = (
+    "ix_transactions_job_id",
+    "ux_transactions_fingerprint",
+    "ix_transactions_merchant_amount",
+    "ix_transactions_date",
+    "ix_transactions_category_primary_date",
+    "ix_transactions_category_detailed_date",
+    "ix_transactions_title_search",
+    "ix_transactions_title_trgm",
+)
+
+
+def create_table_sql(partitioned: bool) -> str:
+    primary_key = "PRIMARY KEY (id, date)" if partitioned else "PRIMARY KEY (id)"
+    partition_by = " PARTITION BY RANGE (date)" if partitioned else ""
+    return f"""
+        CREATE TABLE transactions (
+            id INTEGER NOT NULL DEFAULT nextval('transactions_id_seq'),
+            job_id VARCHAR(36) NOT NULL,
+            date TIMESTAMP WITH TIME ZONE NOT NULL,
+            title VARCHAR(500) NOT NULL,
+            amount DOUBLE PRECISION NOT NULL,
+            currency VARCHAR(10) NOT NULL,
+            category_primary VARCHAR(50) NOT NULL,
+            category_detailed VARCHAR(100) NOT NULL,
+            category_confidence_level VARCHAR(20) NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            fingerprint VARCHAR(64),
+            merchant_key VARCHAR(100),
+            title_search TSVECTOR GENERATED ALWAYS AS (to_tsvector('simple', title)) STORED,
+            CONSTRAINT transactions_pkey {primary_key}
+        ){partition_by}
+    """
+
+
+def detach_old_table():
+    """Rename transactions out of the way, freeing its index and constraint names"""
+    for index in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {index}")
+    op.execute(
+        "ALTER TABLE transactions DROP CONSTRAINT IF EXISTS transactions_job_id_fkey"
+    )
+    op.execute("ALTER TABLE transactions RENAME TO transactions_old")
+    op.execute(
+        "ALTER TABLE transactions_old RENAME CONSTRAINT transactions_pkey "
+        "TO transactions_old_pkey"
+    )
+
+
+def create_indexes(fingerprint_columns: list[str]):
+    op.create_index("ix_transactions_job_id", "transactions", ["job_id"])
+    op.create_index(
+        "ux_transactions_fingerprint", "transactions", fingerprint_columns, unique=True
+    )
+    op.create_index(
+        "ix_transactions_merchant_amount", "transactions", ["merchant_key", "amount"]
+    )
+    op.create_index("ix_transactions_date", "transactions", ["date"])
+    op.create_index(
+        "ix_transactions_category_primary_date",
+        "transactions",
+        ["category_primary", "date"],
+    )
+    op.create_index(
+        "ix_transactions_category_detailed_date",
+        "transactions",
+        ["category_detailed", "date"],
+    )
+    op.create_index(
+        "ix_transactions_title_search",
+        "transactions",
+        ["title_search"],
+        postgresql_using="gin",
+    )
+    op.create_index(
+        "ix_transactions_title_trgm",
+        "transactions",
+        ["title"],
+        postgresql_using="gin",
+        postgresql_ops={"title": "gin_trgm_ops"},
+    )
+    op.create_foreign_key(
+        "transactions_job_id_fkey",
+        "transactions",
+        "jobs",
+        ["job_id"],
+        ["id"],
+        ondelete="CASCADE",
+    )
+
+
+def copy_rows_and_drop_old_table():
+    op.execute(
+        f"INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions_old"
+    )
+    op.execute("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id")
+    op.execute("DROP TABLE transactions_old")
+
+
+def upgrade():
+    detach_old_table()
+    op.execute(create_table_sql(partitioned=True))
+
+    bounds = (
+        op.get_bind()
+        .execute(sa.text("SELECT min(date), max(date) FROM transactions_old"))
+        .one()
+    )
+    if bounds[0] is not None:
+        month, last = month_start(bounds[0]), month_start(bounds[1])
+        while month <= last:
+            op.execute(create_partition_sql(month))
+            month = next_month(month)
+
+    copy_rows_and_drop_old_table()
+    # The fingerprint already covers the date, but unique indexes on a
+    # partitioned table must include the partition key
+    create_indexes(["fingerprint", "date"])
+
+
+def downgrade():
+    detach_old_table()
+    op.execute(create_table_sql(partitioned=False))
+    copy_rows_and_drop_old_table()
+    op.execute(
+        "UPDATE transactions t SET fingerprint = NULL FROM ("
+        "SELECT id, row_number() OVER (PARTITION BY fingerprint ORDER BY id) AS n "
+        "FROM transactions WHERE fingerprint IS NOT NULL) d "
+        "WHERE t.id = d.id AND d.n > 1"
+    )
+    create_indexes(["fingerprint"])
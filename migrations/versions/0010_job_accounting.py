@@ -0,0 +1,32 @@
+"""Per-job cost and latency accounting
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("jobs", sa.Column("bytes_processed", sa.BigInteger(), nullable=True))
+    op.add_column("jobs", sa.Column("extraction_ms", sa.Integer(), nullable=True))
+    op.add_column("jobs", sa.Column("input_tokens", sa.Integer(), nullable=True))
+    op.add_column("jobs", sa.Column("output_tokens", sa.Integer(), nullable=True))
+    op.add_column("jobs", sa.Column("model", sa.String(50), nullable=True))
+    op.create_index("ix_jobs_completed_at", "jobs", ["completed_at"])
+
+
+def downgrade():
+    op.drop_index("ix_jobs_completed_at", table_name="jobs")
+    op.drop_column("jobs", "model")
+    op.drop_column("jobs", "output_tokens")
+    op.drop_column("jobs", "input_tokens")
+    op.drop_column("jobs", "extraction_ms")
+    op.drop_column("jobs", "bytes_processed")
@@ -0,0 +1,22 @@
+"""Bytes removed from job PDFs before extraction
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("jobs", sa.Column("bytes_saved", sa.BigInteger(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("jobs", "bytes_saved")
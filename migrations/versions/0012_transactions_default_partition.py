@@ -0,0 +1,58 @@
+"""Default partition for transactions outside every monthly partition
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19
+
+Monthly partitions are cached per process, so a worker can insert into a month
+that was detached elsewhere; the default partition takes those rows instead of
+the insert failing.
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.partitions import (
+    DEFAULT_PARTITION,
+    PARENT_TABLE,
+    create_default_partition_sql,
+    create_partition_sql,
+    month_start,
+    next_month,
+)
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+# Every column but the generated title_search, which can't be inserted into
+COLUMNS = (
+    "id, job_id, date, title, amount, currency, category_primary, "
+    "category_detailed, category_confidence_level, created_at, fingerprint, "
+    "merchant_key"
+)
+
+
+def upgrade():
+    op.execute(create_default_partition_sql())
+
+
+def downgrade():
+    # Move any rows of the default partition into monthly partitions
+    op.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}")
+    bounds = (
+        op.get_bind()
+        .execute(sa.text(f"SELECT min(date), max(date) FROM {DEFAULT_PARTITION}"))
+        .one()
+    )
+    if bounds[0] is not None:
+        month, last = month_start(bounds[0]), month_start(bounds[1])
+        while month <= last:
+            op.execute(create_partition_sql(month))
+            month = next_month(month)
+        op.execute(
+            f"INSERT INTO {PARENT_TABLE} ({COLUMNS}) "
+            f"SELECT {COLUMNS} FROM {DEFAULT_PARTITION}"
+        )
+    op.execute(f"DROP TABLE {DEFAULT_PARTITION}")
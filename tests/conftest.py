@@ -0,0 +1,5 @@
+"""Test settings: nothing here talks to Gemini or needs a real API key"""
+
+import os
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
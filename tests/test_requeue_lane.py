@@ -0,0 +1,106 @@
+"""A single upload routed to the bulk lane is re-queued on the bulk lane"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from app.db_models import JobStatus
+from app.lanes import BULK, INTERACTIVE
+from app.queues import base
+from app.queues.memory import MemoryTaskQueue
+from app.routes import jobs
+from app.settings import get_settings
+
+
+class FakeUpload:
+    def __init__(self, filename: str, content: bytes):
+        self.filename = filename
+        self.content = content
+
+    async def read(self) -> bytes:
+        return self.content
+
+
+class FakeSession:
+    """Records added rows and answers queries with fixed rows"""
+
+    def __init__(self, rows=()):
+        self.added = []
+        self.rows = list(rows)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def add(self, row):
+        self.added.append(row)
+
+    async def execute(self, query):
+        return SimpleNamespace(all=lambda: self.rows)
+
+    async def commit(self):
+        pass
+
+
+class RecordingQueue:
+    def __init__(self):
+        self.tasks = []
+
+    async def enqueue(self, task: dict):
+        self.tasks.append(task)
+
+
+class Admission:
+    async def admit(self, request, job_count: int = 1) -> str:
+        return "client"
+
+
+def upload(content: bytes):
+    """Upload a PDF, returning the created job and the queued task"""
+    queue = RecordingQueue()
+    request = SimpleNamespace(
+        app=SimpleNamespace(
+            state=SimpleNamespace(admission=Admission(), task_queue=queue)
+        )
+    )
+    db = FakeSession()
+    asyncio.run(jobs.upload_pdf(request, FakeUpload("statement.pdf", content), db))
+    (job,) = db.added
+    (task,) = queue.tasks
+    return job, task
+
+
+def large_pdf() -> bytes:
+    return b"%PDF-1.4\n" + b"0" * (get_settings().INTERACTIVE_MAX_BYTES + 1)
+
+
+def test_upload_records_the_task_lane_on_the_job():
+    job, task = upload(large_pdf())
+    assert task["lane"] == BULK
+    assert job.lane == BULK
+
+    job, task = upload(b"%PDF-1.4\n/Type /Page\n")
+    assert task["lane"] == INTERACTIVE
+    assert job.lane == INTERACTIVE
+
+
+def test_reaper_requeues_a_single_upload_on_its_lane(monkeypatch):
+    content = large_pdf()
+    job, _ = upload(content)
+    job.status = JobStatus.PROCESSING
+    job.worker_id = "dead-worker"
+    job.lease_expires_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+    monkeypatch.setattr(
+        base, "AsyncSessionLocal", lambda: FakeSession(rows=[(job, content)])
+    )
+    queue = MemoryTaskQueue()
+    assert asyncio.run(queue.reap_expired_leases()) == 1
+
+    assert job.status == JobStatus.PENDING
+    assert queue.queues[INTERACTIVE].empty()
+    delivery = queue.queues[BULK].get_nowait()
+    assert delivery.task_id == job.id
+    assert delivery.lane == BULK
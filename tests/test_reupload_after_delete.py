@@ -0,0 +1,55 @@
+"""Re-uploading a deleted statement saves its rows instead of skipping them"""
+
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import Delete, Insert
+
+from app.db_models import JobStatus
+from app.task_worker import insert_transactions, transaction_rows
+
+
+class RecordingSession:
+    """Records executed statements; every INSERT reports its rows inserted"""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        rows = len(statement._multi_values[0]) if isinstance(statement, Insert) else 0
+        return SimpleNamespace(all=lambda: [None] * rows)
+
+
+def transaction(day: int, title: str):
+    return SimpleNamespace(
+        date=datetime(2026, 3, day),
+        title=title,
+        amount=-12.5,
+        currency="EUR",
+        category_primary="FOOD_AND_DRINK",
+        category_detailed="FOOD_AND_DRINK_RESTAURANT",
+        category_confidence_level="HIGH",
+    )
+
+
+def test_rows_of_deleting_jobs_are_removed_before_the_insert():
+    rows = transaction_rows("new-job", [transaction(1, "Cafe"), transaction(2, "Bar")])
+    session = RecordingSession()
+
+    assert asyncio.run(insert_transactions(session, rows)) == 2
+
+    cleanup, insert = session.statements
+    assert isinstance(cleanup, Delete)
+    assert isinstance(insert, Insert)
+
+    compiled = cleanup.compile(dialect=postgresql.dialect())
+    sql = str(compiled)
+    assert "(transactions.fingerprint, transactions.date) IN" in sql
+    assert "jobs.status = " in sql
+    params = list(compiled.params.values())
+    assert JobStatus.DELETING in params
+    # Only the fingerprints being inserted, so live duplicates are still skipped
+    assert [(row["fingerprint"], row["date"]) for row in rows] in params